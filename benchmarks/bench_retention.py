@@ -0,0 +1,58 @@
+"""Measure time and peak memory of applying a retention plan to a large backup directory.
+
+Usage: python benchmarks/bench_retention.py [count] [directory]
+
+Without a directory, snapshots are only created in memory, so just FileInfo and mustering are measured.
+With one, `count` empty snapshots are created in it, if needed, and a pretend-mode prune is measured.
+"""
+
+import sys
+from os import listdir, utime
+from os.path import join
+from time import perf_counter, time
+from tracemalloc import get_traced_memory, start, stop
+
+from hfbr.retention import FileInfo, RetentionPlan, parse_plan
+
+PLAN = [["year", None], ["month", 9], ["1 week", 6], ["1 day", 5], ["1 hour", 18], [None, 10]]
+INTERVAL = 20 * 60
+
+
+def measure(label: str, run) -> None:
+    """Time a run, then repeat it under tracemalloc, which is too slow to time along with."""
+    began = perf_counter()
+    run()
+    elapsed = perf_counter() - began
+    start()
+    run()
+    peak = get_traced_memory()[1]
+    stop()
+    print(f"{label:<10} {elapsed * 1000:>9.1f} ms {peak / 1024 / 1024:>9.1f} MiB peak")
+
+
+def in_memory(plan: RetentionPlan, count: int) -> None:
+    now = time()
+    files = [FileInfo("/var/backup", f"{i}.sq3.bz2", (), now - i * INTERVAL) for i in range(count)]
+    plan.muster(files)
+
+
+def on_disk(plan: RetentionPlan, directory: str, count: int) -> None:
+    existing = sum(1 for name in listdir(directory) if name.endswith(".bz2"))
+    now = time()
+    for i in range(existing, count):
+        path = join(directory, f"{i}.sq3.bz2")
+        open(path, "wb").close()
+        utime(path, (now - i * INTERVAL, now - i * INTERVAL))
+    measure("prune", lambda: plan.prune(directory, prune=False))
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    plan = parse_plan(PLAN)
+    measure("in memory", lambda: in_memory(plan, count))
+    if len(sys.argv) > 2:
+        on_disk(plan, sys.argv[2], count)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,44 +11,143 @@
 # See the License for the specific language governing permissions and limitations under the License.
 #
 from bz2 import BZ2File
-from collections.abc import Callable, Sequence
-from datetime import datetime
+from collections.abc import Callable, Generator, Sequence
+from contextlib import contextmanager, suppress
+from datetime import datetime, timedelta
 from hashlib import sha512
 from logging import getLogger
+from os import chmod, close, replace, scandir, umask, unlink
 from os.path import abspath, dirname, join, splitext
+from tempfile import mkstemp
 from typing import Any
 
+try:
+    import fcntl
+except ImportError:  # not POSIX, so runs can't be kept from overlapping
+    fcntl = None
+
+from hfbr.feed import ChangeFeed
+from hfbr.limits import Limits, ThrottledWriter, TransferStats
+from hfbr.profiling import span
+from hfbr.remote import RemoteError, S3Remote
 from hfbr.retention import RetentionPlan
 
 log = getLogger(__name__)
 
+LOCK_FILENAME = "lock"
+TEMP_PREFIX = "partial-"
+TEMP_SUFFIX = ".tmp"
+
+
+def backup_target_database(
+    target_path: str,
+    backup_dir: str,
+    adaptive_plan: RetentionPlan | None = None,
+    min_interval: timedelta | None = None,
+    limits: Limits | None = None,
+) -> str | None:
+    """Save a compressed snapshot of the target if it changed since the last one, and return its filename.
 
-def backup_target_database(target_path: str, backup_dir: str) -> None:
+    Given an adaptive plan, changes are not saved while that plan would prune their snapshot in favour of another.
+    """
+    limits = limits or Limits()
+    reads, writes = limits.read_bucket(), limits.write_bucket()
+    throttle = reads.consume if reads else None
     hash_path = join(backup_dir, "last_hash")
     hasher = sha512()
-    with open(target_path, "rb") as target:
-        block_transfer(target.read, hasher.update)
+    with span("hash"), open(target_path, "rb") as target, TransferStats("Hashed", reads) as stats:
+        limits.advise_read(target)
+        stats.bytes = block_transfer(target.read, hasher.update, throttle=throttle)
     try:
         with open(hash_path, "rb") as hashfile:
             old_hash = hashfile.read()
     except FileNotFoundError:
         old_hash = b""
     if hasher.digest() != old_hash:
-        snapshot_filename = datetime.now().strftime("%Y%m%d-%H%M") + splitext(target_path)[1] + ".bz2"
+        now = datetime.now()
+        if adaptive_plan and adaptive_plan.supersedes(backup_dir, now.timestamp(), min_interval):
+            log.debug("Change detected, but an existing snapshot supersedes it.")
+            return None
+        snapshot_filename = now.strftime("%Y%m%d-%H%M") + splitext(target_path)[1] + ".bz2"
         snapshot_path = join(backup_dir, snapshot_filename)
         log.debug("Change detected! Saving to %s", snapshot_path)
-        with open(target_path, "rb") as target, BZ2File(snapshot_path, "wb") as snapshot:
-            block_transfer(target.read, snapshot.write)
-        with open(hash_path, "wb") as hashfile:
+        with (
+            span("compress"),
+            atomic_path(snapshot_path) as temp_path,
+            open(target_path, "rb") as target,
+            open(temp_path, "wb") as raw,
+        ):
+            limits.advise_read(target)
+            with TransferStats("Compressed", reads, writes) as stats:
+                with BZ2File(ThrottledWriter(raw, writes) if writes else raw, "wb") as snapshot:
+                    stats.bytes = block_transfer(target.read, snapshot.write, throttle=throttle)
+                limits.advise_written(raw)
+        with atomic_path(hash_path) as temp_path, open(temp_path, "wb") as hashfile:
             hashfile.write(hasher.digest())
+        return snapshot_filename
+    return None
+
+
+@contextmanager
+def atomic_path(path: str) -> Generator[str]:
+    """Yield a temporary path to write to, renamed over `path` once done, so readers never see a partial file."""
+    fd, temp_path = mkstemp(TEMP_SUFFIX, TEMP_PREFIX, dirname(path))  # unique, as runs go unlocked without fcntl
+    close(fd)
+    try:
+        yield temp_path
+    except BaseException:
+        with suppress(FileNotFoundError):
+            unlink(temp_path)
+        raise
+    mask = umask(0)
+    umask(mask)
+    chmod(temp_path, 0o666 & ~mask)  # mkstemp creates files only readable by their owner
+    replace(temp_path, path)
+
+
+def remove_partial_files(backup_dir: str) -> None:
+    with scandir(backup_dir) as entries:
+        partial = [e.path for e in entries if e.name.startswith(TEMP_PREFIX) and e.name.endswith(TEMP_SUFFIX)]
+    for path in partial:
+        log.warning("Removing %s, left over from an interrupted run.", path)
+        with suppress(FileNotFoundError):
+            unlink(path)
+
+
+@contextmanager
+def target_lock(backup_dir: str) -> Generator[bool]:
+    """Try to hold an advisory lock on a backup directory, yielding whether no other run was busy with it."""
+    if fcntl is None:
+        yield True
+        return
+    with open(join(backup_dir, LOCK_FILENAME), "a") as lockfile:
+        try:
+            fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+        else:
+            yield True  # closing the file releases the lock
+
 
+def block_transfer(
+    fread: Callable[[int], bytes],
+    fwrite: Callable[[bytes], Any],
+    length: int = 16 * 1024,
+    throttle: Callable[[int], Any] | None = None,
+) -> int:
+    """Copy blocks using file-like reader and write functions, based on shutil.copyfileobj. Returns bytes copied.
 
-def block_transfer(fread: Callable[[int], bytes], fwrite: Callable[[bytes], Any], length: int = 16 * 1024) -> None:
-    """Copy blocks using file-like reader and write functions, based on shutil.copyfileobj."""
+    If given, `throttle` is called with the size of each block before writing it, and may sleep to limit the rate.
+    """
+    total = 0
     buffer = fread(length)
     while buffer:
+        if throttle:
+            throttle(len(buffer))
         fwrite(buffer)
+        total += len(buffer)
         buffer = fread(length)
+    return total
 
 
 def backup_and_retention(
@@ -57,16 +156,39 @@ def backup_and_retention(
     retention_plan: RetentionPlan | tuple = (),
     pin: Sequence[str] = (),
     prune: bool = True,
+    remote: S3Remote | dict | None = None,
+    feed: bool = False,
+    adaptive: bool = False,
+    min_interval: timedelta | None = None,
+    limits: Limits | None = None,
 ) -> None:
     if not (target_path or backup_dir):
         log.error("Invalid target: no target_path or backup_dir. Check your settings!")
         return
-    if target_path:
-        log.info("Applying backup plan: %s", target_path)
-        if not backup_dir:
-            backup_dir = dirname(abspath(target_path))
-        backup_target_database(target_path, backup_dir)
-    if not isinstance(retention_plan, RetentionPlan):
-        retention_plan = RetentionPlan(retention_plan)
-    assert backup_dir is not None
-    retention_plan.prune(backup_dir, pin, prune)
+    if not backup_dir:
+        backup_dir = dirname(abspath(target_path))
+    with target_lock(backup_dir) as locked:
+        if not locked:
+            log.warning("Skipping %s: another run is still busy with it.", target_path or backup_dir)
+            return
+        if fcntl:  # no other run is writing, so any partial file is left over from one that was killed
+            remove_partial_files(backup_dir)
+        if not isinstance(retention_plan, RetentionPlan):
+            retention_plan = RetentionPlan(retention_plan)
+        added = None
+        if target_path:
+            log.info("Applying backup plan: %s", target_path)
+            adaptive_plan = retention_plan if adaptive else None
+            added = backup_target_database(target_path, backup_dir, adaptive_plan, min_interval, limits)
+        pruned = retention_plan.prune(backup_dir, pin, prune)
+        if feed:
+            with span("feed"):
+                ChangeFeed(backup_dir).append([added] if added else [], pruned)
+        if remote:
+            if not isinstance(remote, S3Remote):
+                remote = S3Remote(**remote)
+            try:
+                with span("push"):
+                    remote.push(backup_dir, pruned)
+            except (RemoteError, OSError) as e:
+                log.error("Failed to push %s to remote: %s", backup_dir, e)
@@ -0,0 +1,159 @@
+#
+# Copyright 2015-2026, Liz Balbuena
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except in
+# compliance with the License. You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and limitations under the License.
+#
+from collections.abc import Sequence
+from http.server import BaseHTTPRequestHandler
+from logging import getLogger
+from os import SEEK_END, fstat, scandir
+from os.path import getsize, isfile, join
+from shutil import copyfileobj
+from typing import BinaryIO, ClassVar
+from urllib.parse import parse_qs, urlsplit
+
+log = getLogger(__name__)
+
+FEED_FILENAME = "changes"
+
+
+class ChangeFeed:
+    """Append-only log of the snapshots added to and pruned from a backup directory.
+
+    Each line is `<sequence>\\t<add|prune>\\t<filename>`, with sequence numbers starting at 1 and increasing by one.
+    Mirrors remember the last sequence number they applied, and only need to fetch the lines after it.
+    """
+
+    def __init__(self, backup_dir: str) -> None:
+        self.backup_dir = backup_dir
+        self.path = join(backup_dir, FEED_FILENAME)
+
+    def append(self, added: Sequence[str] = (), pruned: Sequence[str] = ()) -> None:
+        if not isfile(self.path):
+            added = self._existing_snapshots(added)
+        if not (added or pruned):
+            return
+        with open(self.path, "ab+") as feed:
+            sequence = self._last_sequence(feed)
+            lines = []
+            for action, names in (("add", added), ("prune", pruned)):
+                for name in names:
+                    sequence += 1
+                    lines.append(f"{sequence}\t{action}\t{name}\n")
+            feed.write("".join(lines).encode())
+        log.debug("Change feed of %s is at sequence %d.", self.backup_dir, sequence)
+
+    def last_sequence(self) -> int:
+        try:
+            with open(self.path, "rb") as feed:
+                return self._last_sequence(feed, repair=False)
+        except FileNotFoundError:
+            return 0
+
+    def read_since(self, since: int = 0) -> bytes:
+        """Return the lines after sequence number `since`, finding them by bisecting the file on byte offsets."""
+        try:
+            with open(self.path, "rb") as feed:
+                low, high = 0, fstat(feed.fileno()).st_size
+                while low < high:  # find the first line start whose sequence is greater than `since`
+                    middle = (low + high) // 2
+                    start = self._line_start(feed, middle)
+                    line = feed.readline()
+                    if not line.endswith(b"\n") or int(line.split(b"\t", 1)[0]) > since:
+                        high = start
+                    else:
+                        low = start + len(line)
+                feed.seek(low)
+                data = feed.read()
+        except FileNotFoundError:
+            return b""
+        return data[: data.rfind(b"\n") + 1]  # leave out a line still being written
+
+    def _existing_snapshots(self, added: Sequence[str]) -> list[str]:
+        """Seed a new feed with the snapshots already in the directory, oldest first."""
+        with scandir(self.backup_dir) as entries:
+            snapshots = sorted((e.stat().st_mtime, e.name) for e in entries if e.name.endswith(".bz2"))
+        existing = [name for _, name in snapshots]
+        return existing + [name for name in added if name not in existing]
+
+    @staticmethod
+    def _line_start(feed: BinaryIO, offset: int) -> int:
+        """Seek to the start of the line containing `offset`, and return it."""
+        start = max(offset - 256, 0)
+        while True:
+            feed.seek(start)
+            chunk = feed.read(offset - start)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0 or start == 0:
+                start += newline + 1
+                feed.seek(start)
+                return start
+            start = max(start - 256, 0)
+
+    @classmethod
+    def _last_sequence(cls, feed: BinaryIO, repair: bool = True) -> int:
+        size = feed.seek(0, SEEK_END)
+        if not size:
+            return 0
+        end = size
+        feed.seek(size - 1)
+        if feed.read(1) != b"\n":  # a previous run died while appending
+            end = cls._line_start(feed, size - 1)
+            if repair:
+                feed.truncate(end)
+        if not end:
+            return 0
+        cls._line_start(feed, end - 1)
+        return int(feed.readline().split(b"\t", 1)[0])
+
+
+class FeedRequestHandler(BaseHTTPRequestHandler):
+    """Serve the change feeds and snapshots of the backup directories in `feeds`, keyed by URL path segment.
+
+    - `GET /<name>/changes?since=<sequence>` returns the feed lines after that sequence number.
+    - `GET /<name>/<snapshot>.bz2` returns a snapshot.
+    """
+
+    feeds: ClassVar[dict[str, ChangeFeed]] = {}
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        name, _, filename = url.path.strip("/").partition("/")
+        feed = self.feeds.get(name)
+        if feed is None or "/" in filename:
+            self.send_error(404)
+        elif filename == FEED_FILENAME:
+            try:
+                since = int(parse_qs(url.query).get("since", ["0"])[0])
+            except ValueError:
+                self.send_error(400, "Invalid sequence number")
+                return
+            body = feed.read_since(since)
+            # the last line sent rather than the feed's, which a run may have appended to since
+            sequence = int(body.rsplit(b"\n", 2)[-2].split(b"\t", 1)[0]) if body else since
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("X-Hfbr-Sequence", str(sequence))
+            self.end_headers()
+            self.wfile.write(body)
+        elif filename.endswith(".bz2") and isfile(join(feed.backup_dir, filename)):
+            path = join(feed.backup_dir, filename)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-bzip2")
+            self.send_header("Content-Length", str(getsize(path)))
+            self.end_headers()
+            with open(path, "rb") as snapshot:
+                copyfileobj(snapshot, self.wfile)
+        else:
+            self.send_error(404)
+
+    def log_message(self, format: str, *args) -> None:
+        log.debug("%s " + format, self.address_string(), *args)
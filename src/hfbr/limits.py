@@ -0,0 +1,151 @@
+#
+# Copyright 2015-2026, Liz Balbuena
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except in
+# compliance with the License. You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and limitations under the License.
+#
+import os
+from ctypes import CDLL, get_errno
+from logging import getLogger
+from platform import machine, system
+from time import monotonic, perf_counter, sleep
+from typing import BinaryIO, Self
+
+try:
+    import resource
+except ImportError:  # not POSIX, so disk blocks can't be counted
+    resource = None
+
+log = getLogger(__name__)
+
+IOPRIO_SET_SYSCALLS = {"x86_64": 251, "i686": 289, "aarch64": 30, "armv7l": 314, "ppc64le": 273, "riscv64": 30}
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+
+
+class TokenBucket:
+    """Allow `rate` bytes per second on average, in bursts of up to a second's worth, sleeping when over it."""
+
+    def __init__(self, rate: int) -> None:
+        self.rate = rate
+        self.tokens = float(rate)
+        self.updated = monotonic()
+        self.throttled = 0.0
+
+    def consume(self, amount: int) -> None:
+        now = monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate) - amount
+        self.updated = now
+        if self.tokens < 0:
+            delay = -self.tokens / self.rate
+            self.throttled += delay
+            sleep(delay)
+
+
+class ThrottledWriter:
+    """Minimal file-like object limiting the rate of writes to another, for BZ2File to write compressed data to."""
+
+    def __init__(self, raw: BinaryIO, bucket: TokenBucket) -> None:
+        self.raw = raw
+        self.bucket = bucket
+
+    def write(self, data: bytes) -> int:
+        self.bucket.consume(len(data))
+        return self.raw.write(data)
+
+    def flush(self) -> None:
+        self.raw.flush()
+
+
+class Limits:
+    """Resource limits for backing up a target: read and write rates in bytes per second, and page cache hints."""
+
+    def __init__(self, read_rate: int | None = None, write_rate: int | None = None, fadvise: bool = False) -> None:
+        self.read_rate = read_rate
+        self.write_rate = write_rate
+        self.fadvise = fadvise and hasattr(os, "posix_fadvise")
+
+    def read_bucket(self) -> TokenBucket | None:
+        return TokenBucket(self.read_rate) if self.read_rate else None
+
+    def write_bucket(self) -> TokenBucket | None:
+        return TokenBucket(self.write_rate) if self.write_rate else None
+
+    def advise_read(self, file: BinaryIO) -> None:
+        """Hint that the file is read once, in order, so its pages don't push hotter ones out of the page cache.
+
+        Dropping them afterwards would also drop the pages the target's own service keeps hot, so they are only
+        marked as not to be reused, which Linux honours since 6.3.
+        """
+        if self.fadvise:
+            os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            if hasattr(os, "POSIX_FADV_NOREUSE"):
+                os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_NOREUSE)
+
+    def advise_written(self, file: BinaryIO) -> None:
+        """Drop a file just written from the page cache, as nothing is going to read it soon."""
+        if self.fadvise:
+            file.flush()
+            os.fdatasync(file.fileno())
+            os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+class TransferStats:
+    """Log throughput, time throttled, and blocks that went to disk rather than the page cache, of a transfer."""
+
+    def __init__(self, label: str, *buckets: TokenBucket | None) -> None:
+        self.label = label
+        self.buckets = [bucket for bucket in buckets if bucket]
+        self.bytes = 0
+
+    def __enter__(self) -> Self:
+        self.throttled = sum(bucket.throttled for bucket in self.buckets)
+        self.usage = resource.getrusage(resource.RUSAGE_SELF) if resource else None
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = perf_counter() - self.started
+        throttled = sum(bucket.throttled for bucket in self.buckets) - self.throttled
+        blocks_in = blocks_out = 0
+        if resource and self.usage:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            blocks_in, blocks_out = usage.ru_inblock - self.usage.ru_inblock, usage.ru_oublock - self.usage.ru_oublock
+        log.debug(
+            "%s %d bytes in %.3fs (%.1f MB/s), throttled for %.3fs, %d blocks read and %d written to disk.",
+            self.label,
+            self.bytes,
+            elapsed,
+            self.bytes / elapsed / 1e6 if elapsed else 0,
+            throttled,
+            blocks_in,
+            blocks_out,
+        )
+
+
+def set_priority(nice: int = 0, ioprio: str | int | None = None) -> None:
+    """Lower the CPU and I/O priority of this process: `nice` increment, and `ioprio` "idle" or best-effort 0-7."""
+    if nice:
+        os.nice(nice)
+    if ioprio is None:
+        return
+    if ioprio == "idle":
+        value = IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT
+    elif isinstance(ioprio, int) and 0 <= ioprio <= 7:
+        value = IOPRIO_CLASS_BE << IOPRIO_CLASS_SHIFT | ioprio
+    else:
+        raise ValueError(f"Invalid ioprio: {ioprio!r}. Expected 'idle', or a best-effort level from 0 to 7.")
+    syscall = IOPRIO_SET_SYSCALLS.get(machine())
+    if system() != "Linux" or syscall is None:
+        log.warning("Setting ioprio is not supported on %s %s.", system(), machine())
+        return
+    if CDLL(None, use_errno=True).syscall(syscall, IOPRIO_WHO_PROCESS, 0, value) != 0:
+        log.warning("Failed to set ioprio: %s", os.strerror(get_errno()))
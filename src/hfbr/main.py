@@ -10,48 +10,127 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and limitations under the License.
 #
+import sys
 from argparse import ArgumentParser, Namespace
+from collections.abc import Callable
+from datetime import timedelta
+from http.server import ThreadingHTTPServer
 from logging import getLogger
 from logging.config import dictConfig
-from os.path import isfile
+from os import makedirs
+from os.path import abspath, basename, dirname, isfile
 
 from yaml import safe_load
 
 from hfbr.backup import backup_and_retention
-from hfbr.retention import RetentionPlan, parse_duration
+from hfbr.feed import ChangeFeed, FeedRequestHandler
+from hfbr.limits import Limits, set_priority
+from hfbr.profiling import PROFILE_MODES, profile
+from hfbr.remote import S3Remote
+from hfbr.retention import RetentionPlan, parse_duration, parse_plan
+from hfbr.simulation import SimulationResult, diff_kept, recorded_timeline, simulate, synthetic_timeline
 
 log = getLogger(__name__)
 
 
 def main() -> None:
-    settings = Settings()
+    args = sys.argv[1:]
+    if args and args[0] in COMMANDS:
+        COMMANDS[args[0]](args[1:])
+        return
+    settings = Settings(args)
+    set_priority(**settings.priority)
     log.info("^" * 40)
-    for item in settings:
-        backup_and_retention(**item)
+    for index, item in enumerate(settings, 1):
+        with profile(settings.profile, _profile_name(index, item), settings.profile_dir, settings.profile_top):
+            backup_and_retention(**item)
     log.info("v" * 40)
 
 
+def _backup_dir(item: dict) -> str:
+    return abspath(item.get("backup_dir") or dirname(abspath(item.get("target_path", ""))))
+
+
+def _target_name(item: dict) -> str:
+    return basename(_backup_dir(item))
+
+
+def _profile_name(index: int, item: dict) -> str:
+    path = item.get("backup_dir") or item.get("target_path") or "target"
+    return f"{index:02d}-{basename(path.rstrip('/'))}"
+
+
 class Settings(list):
     def __init__(self, args: list[str] | None = None) -> None:
         parser = ArgumentParser(description="High Frequency Backup and Retention")
         parser.add_argument("-c", "--config", default="settings.yaml", help="path to settings YAML file")
         parser.add_argument("target_path", nargs="?", help="file to back up (CLI mode)")
         parser.add_argument("backup_dir", nargs="?", help="backup directory (CLI mode)")
+        parser.add_argument("--profile", choices=PROFILE_MODES, help="profile each target, logging where time goes")
+        parser.add_argument("--profile-dir", default=".", help="directory for per-target profile dumps")
+        parser.add_argument("--profile-top", type=int, default=20, help="entries in logged profile summaries")
         parsed = parser.parse_args(args)
+        self.profile: str | None = parsed.profile
+        self.profile_dir: str = parsed.profile_dir
+        self.profile_top: int = parsed.profile_top
+        if parsed.profile in ("cprofile", "tracemalloc"):
+            try:
+                makedirs(parsed.profile_dir, exist_ok=True)
+            except OSError as e:
+                parser.error(f"Invalid --profile-dir {parsed.profile_dir}: {e.strerror}")
 
         config = self._load_yaml(parsed.config) or {}
         if "logging" in config:
             dictConfig(config["logging"])
         super().__init__(config.get("targets") or list(self._targets_from_args(parsed)))
-        plans: dict[str, RetentionPlan] = {}
-        for name, slots in config.get("plans", {}).items():
-            plans[name] = RetentionPlan(tuple((parse_duration(s[0]), s[1]) for s in slots))
+        plans = self._load_plans(config)
+        limits = dict(config.get("limits") or {})
+        self.priority = {name: limits.pop(name) for name in ("nice", "ioprio") if name in limits}
         for item in self:
             plan = item.get("retention_plan")
             if isinstance(plan, str):
                 item["retention_plan"] = plans[plan]
             elif isinstance(plan, list):
-                item["retention_plan"] = RetentionPlan(tuple((parse_duration(s[0]), s[1]) for s in plan))
+                item["retention_plan"] = parse_plan(plan)
+            if isinstance(item.get("min_interval"), str):
+                item["min_interval"] = _duration(item["min_interval"])
+            target_limits = item.get("limits") or {}
+            if "nice" in target_limits or "ioprio" in target_limits:
+                raise ValueError(
+                    f"Invalid limits for {_backup_dir(item)}: nice and ioprio apply to the whole run,"
+                    " so they are only allowed in the top-level limits."
+                )
+            if limits or target_limits:
+                item["limits"] = Limits(**{**limits, **target_limits})
+            remote = item.get("remote")
+            if isinstance(remote, str):
+                # targets sharing a named remote each get their own key namespace under its prefix
+                named = config["remotes"][remote]
+                prefix = named.get("prefix", "") + _target_name(item) + "/"
+                item["remote"] = S3Remote(**{**named, "prefix": prefix})
+            elif isinstance(remote, dict):
+                item["remote"] = S3Remote(**remote)
+        self._check_remote_namespaces()
+
+    def _check_remote_namespaces(self) -> None:
+        """Fail if targets with different backup directories would push to the same keys."""
+        owners: dict[tuple[str, str, str], str] = {}
+        for item in self:
+            remote = item.get("remote")
+            if not isinstance(remote, S3Remote):
+                continue
+            backup_dir = _backup_dir(item)
+            namespace = (remote.endpoint.geturl(), remote.bucket, remote.prefix)
+            owner = owners.setdefault(namespace, backup_dir)
+            if owner != backup_dir:
+                raise ValueError(
+                    f"Targets backed up to {owner} and {backup_dir} would share the remote prefix {remote.prefix!r}."
+                    " Rename one of the backup directories, or give one an inline remote with its own prefix."
+                )
+
+    @staticmethod
+    def _load_plans(config: dict) -> dict[str, RetentionPlan]:
+        return {name: parse_plan(slots) for name, slots in config.get("plans", {}).items()}
 
     @staticmethod
     def _load_yaml(config_path: str) -> dict | None:
@@ -68,3 +147,94 @@ class Settings(list):
         if parsed.backup_dir:
             target["backup_dir"] = parsed.backup_dir
         return [target]
+
+
+def plan_sim(args: list[str]) -> None:
+    """Project retained snapshots and storage of a retention plan over simulated time, optionally against another."""
+    parser = ArgumentParser(prog="hfbr plan-sim", description="Simulate retention plans without touching any files")
+    parser.add_argument("-c", "--config", default="settings.yaml", help="path to settings YAML file with named plans")
+    parser.add_argument("plan", help="plan name from the settings file, or inline YAML like '[[null, 10], [month, 3]]'")
+    parser.add_argument("compare", nargs="?", help="second plan, to diff the snapshots each one keeps")
+    parser.add_argument("--timeline", help="backup directory or text file of recorded `timestamp [size]` snapshots")
+    parser.add_argument("--duration", default="90 days", help="simulated time for synthetic timelines")
+    parser.add_argument("--interval", default="20 minutes", help="cron interval for synthetic timelines")
+    parser.add_argument("--change-rate", type=float, default=1.0, help="chance of the target changing at each run")
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="snapshot size in bytes for synthetic timelines")
+    parser.add_argument("--seed", type=int, help="random seed for synthetic timelines")
+    parser.add_argument("--report", default="1 week", help="simulated time between report lines")
+    parser.add_argument("--once", action="store_true", help="apply plans once to the whole timeline, without replay")
+    parsed = parser.parse_args(args)
+
+    plans = Settings._load_plans(Settings._load_yaml(parsed.config) or {})
+    if parsed.timeline:
+        timeline = recorded_timeline(parsed.timeline)
+    else:
+        timeline = synthetic_timeline(
+            _duration(parsed.duration), _duration(parsed.interval), parsed.change_rate, parsed.size, seed=parsed.seed
+        )
+    results = []
+    for name in filter(None, (parsed.plan, parsed.compare)):
+        results.append(simulate(_sim_plan(name, plans), timeline, _duration(parsed.report), replay=not parsed.once))
+        _print_simulation(name, results[-1])
+    if len(results) == 2:
+        lines = diff_kept(results[0].kept, results[1].kept)
+        print(f"--- {parsed.plan}")
+        print(f"+++ {parsed.compare}")
+        print("\n".join(lines) if lines else "(both plans keep the same snapshots)")
+
+
+def _sim_plan(name: str, plans: dict[str, RetentionPlan]) -> RetentionPlan:
+    if name in plans:
+        return plans[name]
+    slots = safe_load(name)
+    if isinstance(slots, list):
+        return parse_plan(slots)
+    known = ", ".join(sorted(plans)) or "none"
+    raise ValueError(f"Unknown plan: {name!r}. Expected inline YAML slots or a configured plan ({known}).")
+
+
+def _duration(value: str) -> timedelta:
+    duration = parse_duration(value)
+    if isinstance(duration, timedelta):
+        return duration
+    raise ValueError(f"Invalid duration: {value!r}. Expected a fixed length like '1 week' or '20 minutes'.")
+
+
+def _print_simulation(name: str, result: SimulationResult) -> None:
+    print(f"Plan {name}: {result.written} snapshots written, {len(result.kept)} kept")
+    print(f"{'date':<16} {'written':>9} {'written bytes':>16} {'kept':>6} {'kept bytes':>14}")
+    for sample in result.samples:
+        when = sample.when.strftime("%Y-%m-%d %H:%M")
+        print(f"{when:<16} {sample.written:>9} {sample.written_bytes:>16} {sample.kept:>6} {sample.kept_bytes:>14}")
+    print()
+
+
+def serve(args: list[str]) -> None:
+    """Serve the change feeds and snapshots of all targets over HTTP, for mirrors to pull from."""
+    parser = ArgumentParser(prog="hfbr serve", description="Serve change feeds and snapshots to mirrors")
+    parser.add_argument("-c", "--config", default="settings.yaml", help="path to settings YAML file")
+    parser.add_argument("--bind", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8400, help="port to listen on")
+    parsed = parser.parse_args(args)
+
+    feeds: dict[str, ChangeFeed] = {}
+    for item in Settings(["-c", parsed.config]):
+        if not item.get("feed"):
+            continue
+        name, backup_dir = _target_name(item), _backup_dir(item)
+        if name in feeds and abspath(feeds[name].backup_dir) != backup_dir:
+            log.fatal(
+                "Both %s and %s would be served as /%s/. Rename one of them.", feeds[name].backup_dir, backup_dir, name
+            )
+            raise SystemExit(1)
+        feeds[name] = ChangeFeed(item.get("backup_dir") or backup_dir)
+    if not feeds:
+        log.fatal("No targets with a change feed! Set `feed: true` on the targets to serve.")
+        raise SystemExit(1)
+    handler = type("Handler", (FeedRequestHandler,), {"feeds": feeds})
+    with ThreadingHTTPServer((parsed.bind, parsed.port), handler) as server:
+        log.info("Serving %s on http://%s:%d/", ", ".join(sorted(feeds)), parsed.bind, parsed.port)
+        server.serve_forever()
+
+
+COMMANDS: dict[str, Callable[[list[str]], None]] = {"plan-sim": plan_sim, "serve": serve}
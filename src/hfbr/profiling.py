@@ -0,0 +1,103 @@
+#
+# Copyright 2015-2026, Liz Balbuena
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except in
+# compliance with the License. You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and limitations under the License.
+#
+import tracemalloc
+from collections.abc import Generator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from cProfile import Profile
+from io import StringIO
+from logging import getLogger
+from os.path import join
+from pstats import Stats
+from time import perf_counter
+
+log = getLogger(__name__)
+
+PROFILE_MODES = ("spans", "cprofile", "tracemalloc")
+
+_spans: dict[str, float] | None = None  # time spent in each phase, while profiling
+_no_span = nullcontext()
+
+
+def span(name: str) -> AbstractContextManager:
+    """Time a phase of the run, such as hashing or mustering, into the current profile.
+
+    The phases are always marked, but only timed while profiling, costing a single check otherwise.
+    """
+    return _no_span if _spans is None else _Span(name)
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        if _spans is not None:
+            _spans[self.name] = _spans.get(self.name, 0.0) + perf_counter() - self.started
+
+
+@contextmanager
+def profile(mode: str | None, name: str, output_dir: str = ".", top: int = 20) -> Generator[None]:
+    """Profile a target, logging the time of its phases, and for cprofile and tracemalloc a top-N summary.
+
+    The full cProfile stats or tracemalloc snapshot are dumped to `<name>.prof` or `<name>.tracemalloc`.
+    """
+    global _spans
+    if not mode:
+        yield
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Invalid profile mode: {mode!r}. Expected one of {', '.join(PROFILE_MODES)}.")
+    _spans = {}
+    profiler = Profile() if mode == "cprofile" else None
+    if mode == "tracemalloc":
+        tracemalloc.start()
+    started = perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        elapsed = perf_counter() - started
+        spans, _spans = _spans, None
+        phases = ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in spans.items())
+        log.info("Profile of %s: %.3fs in total%s", name, elapsed, f" ({phases})" if phases else "")
+        try:  # profiling must never stop backups, nor hide what stopped one
+            if profiler:
+                _dump_cprofile(profiler, join(output_dir, name + ".prof"), top)
+            elif mode == "tracemalloc":
+                _dump_tracemalloc(join(output_dir, name + ".tracemalloc"), top)
+        except OSError as e:
+            log.error("Failed to save the profile of %s: %s", name, e)
+
+
+def _dump_cprofile(profiler: Profile, path: str, top: int) -> None:
+    profiler.dump_stats(path)
+    summary = StringIO()
+    Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(top)
+    log.info("Saved cProfile stats to %s. Top %d by cumulative time:\n%s", path, top, summary.getvalue().strip())
+
+
+def _dump_tracemalloc(path: str, top: int) -> None:
+    snapshot = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    snapshot.dump(path)
+    lines = "\n".join(str(stat) for stat in snapshot.statistics("lineno")[:top])
+    log.info("Saved tracemalloc snapshot to %s. Peak %d bytes, top %d still allocated:\n%s", path, peak, top, lines)
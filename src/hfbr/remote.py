@@ -0,0 +1,291 @@
+#
+# Copyright 2015-2026, Liz Balbuena
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except in
+# compliance with the License. You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and limitations under the License.
+#
+from base64 import b64encode
+from collections.abc import Generator, Sequence
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from hashlib import md5, sha256
+from hmac import new as hmac_new
+from http.client import HTTPConnection, HTTPException, HTTPResponse, HTTPSConnection
+from logging import getLogger
+from os import environ, scandir
+from os.path import join
+from queue import Empty, LifoQueue
+from urllib.parse import quote, urlsplit
+from xml.etree.ElementTree import Element, ParseError, SubElement, fromstring, tostring
+
+log = getLogger(__name__)
+
+DELETE_BATCH = 1000  # most objects a DeleteObjects request may carry
+RETRIED_ERRORS = (HTTPException, ConnectionError)  # an idle pooled connection may have been closed by the server
+
+
+class RemoteError(Exception):
+    pass
+
+
+class S3Remote:
+    """Mirror of a backup directory on an S3-compatible object store, using path-style requests signed with SigV4."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        bucket: str,
+        prefix: str = "",
+        access_key: str | None = None,
+        secret_key: str | None = None,
+        region: str = "us-east-1",
+        part_size: int = 8 * 1024 * 1024,
+        workers: int = 4,
+    ) -> None:
+        self.endpoint = urlsplit(endpoint)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.access_key = access_key or environ.get("AWS_ACCESS_KEY_ID", "")
+        self.secret_key = secret_key or environ.get("AWS_SECRET_ACCESS_KEY", "")
+        self.region = region
+        self.part_size = part_size
+        self.workers = workers
+        self._idle: LifoQueue[HTTPConnection] = LifoQueue()
+
+    def push(self, backup_dir: str, pruned: Sequence[str] = ()) -> None:
+        """Upload snapshots missing from the remote, then delete the remote copies of those retention just pruned.
+
+        Remote snapshots are never deleted only because they are missing locally, so that an empty or unmounted
+        backup_dir can't wipe the remote.
+        """
+        with scandir(backup_dir) as entries:
+            local = {e.name: e.stat().st_size for e in entries if e.name.endswith(".bz2")}
+        remote = self.list_objects()
+        missing = sorted(name for name, size in local.items() if remote.get(name) != size)
+        resumable = self._abort_stale_uploads({self.prefix + name for name in missing if local[name] > self.part_size})
+        log.info("Pushing %d of %d snapshots to %s.", len(missing), len(local), self._path())
+        with ThreadPoolExecutor(self.workers) as pool:
+            small = [name for name in missing if local[name] <= self.part_size]
+            for name in pool.map(lambda name: self.put_object(join(backup_dir, name), name), small):
+                log.debug("Pushed %s", name)
+            for name in missing:
+                if local[name] > self.part_size:
+                    upload_id = resumable.get(self.prefix + name, "")
+                    self.multipart_upload(join(backup_dir, name), name, local[name], pool, upload_id)
+                    log.debug("Pushed %s", name)
+        extra = sorted(name for name in pruned if name in remote)
+        for name in extra:
+            log.info("Prune remote %s", name)
+        if extra:
+            self.delete_objects(extra)
+
+    def list_objects(self) -> dict[str, int]:
+        """Map the name of each remote snapshot to its size."""
+        objects: dict[str, int] = {}
+        query = {"list-type": "2", "prefix": self.prefix}
+        while True:
+            root = self._request_xml("GET", "", query)
+            for item in root.iterfind("{*}Contents"):
+                name = item.findtext("{*}Key", "")[len(self.prefix) :]
+                if name.endswith(".bz2") and "/" not in name:
+                    objects[name] = int(item.findtext("{*}Size", "0"))
+            if root.findtext("{*}IsTruncated") != "true":
+                return objects
+            query["continuation-token"] = root.findtext("{*}NextContinuationToken", "")
+
+    def list_uploads(self) -> list[tuple[str, str]]:
+        """List the (key, upload ID) of each unfinished multipart upload of a snapshot."""
+        uploads = []
+        query = {"uploads": "", "prefix": self.prefix}
+        while True:
+            root = self._request_xml("GET", "", query)
+            for upload in root.iterfind("{*}Upload"):
+                key = upload.findtext("{*}Key", "")
+                name = key[len(self.prefix) :]
+                if name.endswith(".bz2") and "/" not in name:
+                    uploads.append((key, upload.findtext("{*}UploadId", "")))
+            if root.findtext("{*}IsTruncated") != "true":
+                return uploads
+            query["key-marker"] = root.findtext("{*}NextKeyMarker", "")
+            query["upload-id-marker"] = root.findtext("{*}NextUploadIdMarker", "")
+
+    def _abort_stale_uploads(self, keys: set[str]) -> dict[str, str]:
+        """Abort unfinished uploads other than one for each of `keys`, as their parts are stored until then.
+
+        Return the upload to resume for those of `keys` that have one.
+        """
+        resumable: dict[str, str] = {}
+        for key, upload_id in self.list_uploads():
+            if key in keys and key not in resumable:
+                resumable[key] = upload_id
+            else:
+                log.info("Abort unfinished upload of %s", key)
+                self._request("DELETE", key, {"uploadId": upload_id})
+        return resumable
+
+    def put_object(self, path: str, name: str) -> str:
+        with open(path, "rb") as f:
+            self._request("PUT", self.prefix + name, body=f.read())
+        return name
+
+    def multipart_upload(self, path: str, name: str, size: int, pool: Executor, upload_id: str = "") -> None:
+        """Upload a large file in parallel parts, resuming the given unfinished upload of the same object if any."""
+        key = self.prefix + name
+        done = self._list_parts(key, upload_id, size) if upload_id else {}
+        if upload_id:
+            log.info("Resuming upload of %s with %d parts done.", name, len(done))
+        else:
+            upload_id = self._request_xml("POST", key, {"uploads": ""}).findtext("{*}UploadId", "")
+        count = (size + self.part_size - 1) // self.part_size
+        todo = [number for number in range(1, count + 1) if number not in done]
+        for number, etag in zip(todo, pool.map(lambda n: self._upload_part(path, key, upload_id, n), todo)):
+            done[number] = etag
+        complete = Element("CompleteMultipartUpload")
+        for number in range(1, count + 1):
+            part = SubElement(complete, "Part")
+            SubElement(part, "PartNumber").text = str(number)
+            SubElement(part, "ETag").text = done[number]
+        self._request("POST", key, {"uploadId": upload_id}, tostring(complete))
+
+    def _list_parts(self, key: str, upload_id: str, size: int) -> dict[int, str]:
+        """Map the number of each complete part of an unfinished upload to its ETag."""
+        done: dict[int, str] = {}
+        query = {"uploadId": upload_id}
+        while True:
+            root = self._request_xml("GET", key, query)
+            for part in root.iterfind("{*}Part"):
+                number = int(part.findtext("{*}PartNumber", "0"))
+                if int(part.findtext("{*}Size", "0")) == min(self.part_size, size - (number - 1) * self.part_size):
+                    done[number] = part.findtext("{*}ETag", "")
+            if root.findtext("{*}IsTruncated") != "true":
+                return done
+            query["part-number-marker"] = root.findtext("{*}NextPartNumberMarker", "")
+
+    def _upload_part(self, path: str, key: str, upload_id: str, number: int) -> str:
+        with open(path, "rb") as f:
+            f.seek((number - 1) * self.part_size)
+            body = f.read(self.part_size)
+        query = {"partNumber": str(number), "uploadId": upload_id}
+        return self._request("PUT", key, query, body, etag=True).decode()
+
+    def delete_objects(self, names: list[str]) -> None:
+        for start in range(0, len(names), DELETE_BATCH):
+            delete = Element("Delete")
+            SubElement(delete, "Quiet").text = "true"
+            for name in names[start : start + DELETE_BATCH]:
+                SubElement(SubElement(delete, "Object"), "Key").text = self.prefix + name
+            body = tostring(delete)
+            root = self._request_xml("POST", "", {"delete": ""}, body, {"content-md5": _md5(body)})
+            for error in root.iterfind("{*}Error"):
+                log.error("Failed to prune remote %s: %s", error.findtext("{*}Key"), error.findtext("{*}Message"))
+
+    def _request(
+        self,
+        method: str,
+        key: str,
+        query: dict[str, str] | None = None,
+        body: bytes = b"",
+        headers: dict[str, str] | None = None,
+        etag: bool = False,
+    ) -> bytes:
+        """Send a signed request over a pooled connection, returning the response body, or its ETag if asked."""
+        path = self._path(key)
+        query = query or {}
+        headers = self._sign(method, path, query, body, headers or {})
+        target = quote(path) + ("?" + _canonical_query(query) if query else "")
+        with self._connection() as connection:
+            try:
+                response = _send(connection, method, target, body, headers)
+                content = response.read()
+            except HTTPException as e:
+                raise RemoteError(f"{method} {path} failed: {type(e).__name__} {e}") from e
+        if response.status >= 300:
+            raise RemoteError(f"{method} {path} failed: {response.status} {response.reason} {content[:200]!r}")
+        return response.getheader("ETag", "").encode() if etag else content
+
+    def _request_xml(
+        self,
+        method: str,
+        key: str,
+        query: dict[str, str] | None = None,
+        body: bytes = b"",
+        headers: dict[str, str] | None = None,
+    ) -> Element:
+        """Send a signed request, returning the XML document in the response body."""
+        try:
+            return fromstring(self._request(method, key, query, body, headers))
+        except ParseError as e:
+            raise RemoteError(f"{method} {self._path(key)} returned invalid XML: {e}") from e
+
+    @contextmanager
+    def _connection(self) -> Generator[HTTPConnection]:
+        try:
+            connection = self._idle.get_nowait()
+        except Empty:
+            cls = HTTPSConnection if self.endpoint.scheme == "https" else HTTPConnection
+            connection = cls(self.endpoint.netloc, timeout=60)
+        try:
+            yield connection
+        except BaseException:
+            connection.close()
+            raise
+        self._idle.put(connection)
+
+    def _path(self, key: str = "") -> str:
+        return f"{self.endpoint.path.rstrip('/')}/{self.bucket}" + (f"/{key}" if key else "")
+
+    def _sign(self, method: str, path: str, query: dict[str, str], body: bytes, headers: dict[str, str]) -> dict:
+        now = datetime.now(UTC)
+        date = now.strftime("%Y%m%d")
+        headers = {
+            **headers,
+            "host": self.endpoint.netloc,
+            "x-amz-content-sha256": sha256(body).hexdigest(),
+            "x-amz-date": now.strftime("%Y%m%dT%H%M%SZ"),
+        }
+        signed = ";".join(sorted(headers))
+        canonical = "\n".join(
+            (
+                method,
+                quote(path),
+                _canonical_query(query),
+                "".join(f"{name}:{headers[name].strip()}\n" for name in sorted(headers)),
+                signed,
+                headers["x-amz-content-sha256"],
+            )
+        )
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        to_sign = "\n".join(("AWS4-HMAC-SHA256", headers["x-amz-date"], scope, sha256(canonical.encode()).hexdigest()))
+        key = ("AWS4" + self.secret_key).encode()
+        for part in (date, self.region, "s3", "aws4_request"):
+            key = hmac_new(key, part.encode(), sha256).digest()
+        signature = hmac_new(key, to_sign.encode(), sha256).hexdigest()
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, SignedHeaders={signed}, Signature={signature}"
+        )
+        return headers
+
+
+def _send(connection: HTTPConnection, method: str, target: str, body: bytes, headers: dict) -> HTTPResponse:
+    try:
+        connection.request(method, target, body, headers)
+        return connection.getresponse()
+    except RETRIED_ERRORS:
+        connection.close()
+        connection.request(method, target, body, headers)
+        return connection.getresponse()
+
+
+def _canonical_query(query: dict[str, str]) -> str:
+    return "&".join(f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}" for name, value in sorted(query.items()))
+
+
+def _md5(body: bytes) -> str:
+    return b64encode(md5(body).digest()).decode()
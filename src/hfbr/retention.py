@@ -10,49 +10,114 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and limitations under the License.
 #
-from collections.abc import Sequence
+from collections.abc import Collection, Iterable, Iterator, Sequence
 from datetime import datetime, timedelta
 from functools import reduce
+from itertools import groupby, islice
 from logging import getLogger
-from os import listdir, unlink
-from os.path import basename, getmtime, join
+from operator import attrgetter
+from os import scandir, unlink
+from os.path import getmtime, join
 from re import compile as re_compile
+from typing import Any, TypeVar
+
+from hfbr.profiling import span
 
 log = getLogger(__name__)
 
+FileInfoT = TypeVar("FileInfoT", bound="FileInfo")
+
 
 class RetentionPlan:
     def __init__(self, plan_description: tuple[tuple[timedelta | str | None, int | None], ...] | None = None) -> None:
         self.plan = plan_description or ()
 
-    def prune(self, target_dir: str = ".", pinned_list: Sequence[str] = (), prune: bool = False) -> None:
-        if True not in [True for slot in self.plan if slot[1]]:  # at least one slot with limited quantity?
+    @property
+    def limited(self) -> bool:
+        """Whether at least one slot has a limited quantity, i.e. whether this plan can prune anything."""
+        return any(slot[1] for slot in self.plan)
+
+    def prune(self, target_dir: str = ".", pinned_list: Sequence[str] = (), prune: bool = False) -> list[str]:
+        """Apply the plan to the snapshots in target_dir, and return the filenames of those deleted."""
+        if not self.limited:
             log.info("No retention plan on %s. Keeping all files.", target_dir)
-            return
+            return []
         log.info("Applying retention plan to %s.", target_dir)
-        files = [FileInfo(target_dir, f, pinned_list) for f in listdir(target_dir) if f.endswith(".bz2")]
-        files.sort(key=lambda f: -f.timestamp)
+        pinned = frozenset(pinned_list)
+        with span("scan"), scandir(target_dir) as entries:
+            files = [
+                FileInfo(target_dir, e.name, pinned, e.stat().st_mtime) for e in entries if e.name.endswith(".bz2")
+            ]
+        with span("muster"):
+            self.muster(files)
+        pruned = []
+        with span("prune"):
+            for file in files:
+                if file.pinned:
+                    log.debug("Keep file %s", file)
+                else:
+                    log.info("Prune file %s", file)
+                    if prune:
+                        unlink(file.filename)
+                        pruned.append(file.name)
+        return pruned
+
+    def supersedes(self, target_dir: str, timestamp: float, min_interval: timedelta | None = None) -> bool:
+        """Whether a new snapshot at `timestamp` is certain to be pruned in favour of those already in target_dir.
+
+        The earliest snapshot of each timeslot is kept, so that is the case when the newest existing snapshot shares
+        all of its timeslots. Slots of latest snapshots ([null, N]) would keep it for a while: these only count once
+        the newest snapshot is `min_interval` old, and never if not given. Without such slots, `min_interval` is moot.
+        """
+        if not self.limited or any(granularity is None and not quantity for granularity, quantity in self.plan):
+            return False
+        with scandir(target_dir) as entries:
+            newest = max((e.stat().st_mtime for e in entries if e.name.endswith(".bz2")), default=None)
+        if newest is None:
+            return False
+        latest_slots = any(granularity is None for granularity, _ in self.plan)
+        if latest_slots and min_interval is not None and timestamp - newest >= min_interval.total_seconds():
+            return False
+        new, existing = FileInfo(target_dir, "", (), timestamp), FileInfo(target_dir, "", (), newest)
+        latest_first = False
+        for granularity, quantity in self.plan:
+            if granularity is None:
+                latest_first = latest_first or quantity == 1  # then only the new one is pinned, winning later ties
+                continue
+            slot = SlotOfRetention(granularity, quantity)
+            if latest_first or slot._calc(new) != slot._calc(existing):
+                return False
+        return True
+
+    def muster(self, files: list[FileInfoT]) -> None:
+        """Sort files newest first and pin the ones fulfilling each slot of the plan, in declaration order."""
+        files.sort(key=attrgetter("timestamp"), reverse=True)
         for granularity, quantity in self.plan:
             SlotOfRetention(granularity, quantity).muster(files)
-        for file in files:
-            if file.pinned:
-                log.debug("Keep file " + str(file))
-            else:
-                log.info("Prune file " + str(file))
-                if prune:
-                    unlink(file.filename)
 
 
 class FileInfo:
-    def __init__(self, dirpath: str, filename: str, pinned_list: Sequence[str]) -> None:
-        self.dirpath = dirpath
-        self.filename = join(dirpath, filename)
-        self.timestamp = getmtime(self.filename)
-        self.when = datetime.fromtimestamp(self.timestamp)
-        self.pinned = filename in pinned_list
+    """A snapshot in a backup directory. Kept compact, as there may be hundreds of thousands of them at once."""
+
+    __slots__ = ("dirpath", "name", "pinned", "timestamp")
+
+    def __init__(self, dirpath: str, name: str, pinned_list: Collection[str], timestamp: float | None = None) -> None:
+        self.dirpath = dirpath  # the same string for every file in the directory
+        self.name = name
+        self.timestamp = getmtime(join(dirpath, name)) if timestamp is None else timestamp
+        self.pinned = name in pinned_list
+
+    @property
+    def filename(self) -> str:
+        return join(self.dirpath, self.name)
+
+    @property
+    def when(self) -> datetime:
+        """Local time of the snapshot, computed on demand for the slots and log lines that need it."""
+        return datetime.fromtimestamp(self.timestamp)
 
     def __str__(self) -> str:
-        return " ".join((self.when.strftime("%Y%m%d%H%M%S"), basename(self.filename)))
+        return " ".join((self.when.strftime("%Y%m%d%H%M%S"), self.name))
 
     def reduce(self, them: "FileInfo") -> "FileInfo":
         if self.pinned != them.pinned:
@@ -77,6 +142,11 @@ def parse_duration(value: str | None) -> timedelta | str | None:
     return timedelta(**{unit: amount})
 
 
+def parse_plan(slots: Sequence[Sequence[Any]]) -> RetentionPlan:
+    """Build a RetentionPlan from its settings file representation, e.g. [["1 week", 6], [null, 10]]."""
+    return RetentionPlan(tuple((parse_duration(s[0]), s[1]) for s in slots))
+
+
 class SlotOfRetention:
     def __init__(self, granularity: timedelta | str | None, quantity: int | None) -> None:
         self.quantity = quantity
@@ -92,18 +162,13 @@ class SlotOfRetention:
         else:
             raise ValueError("Unknown granularity type %s", type(granularity))
 
-    def muster(self, list_of_files: list[FileInfo]) -> None:
-        timeslots: dict[int, list[FileInfo]] = {}
-        for fileinfo in list_of_files:
-            position = self._calc(fileinfo)
-            if position not in timeslots:
-                timeslots[position] = []
-            timeslots[position].append(fileinfo)
-        keys = sorted(timeslots.keys(), reverse=True)
+    def muster(self, list_of_files: Sequence[FileInfo]) -> None:
+        """Pin the best file of each of the latest timeslots. Files must be sorted newest first."""
+        timeslots: Iterable[tuple[int, Iterator[FileInfo]]] = groupby(list_of_files, self._calc)
         if self.quantity:
-            keys = keys[: self.quantity]
-        for slot in keys:
-            chosen = reduce(FileInfo.reduce, timeslots[slot])
+            timeslots = islice(timeslots, self.quantity)
+        for _, files in timeslots:
+            chosen = reduce(FileInfo.reduce, files)
             chosen.pinned = True
 
     def _calc_secdiv(self, fileinfo: FileInfo) -> int:
@@ -111,7 +176,8 @@ class SlotOfRetention:
         return int(fileinfo.timestamp / self.granularity)
 
     def _calc_month(self, fileinfo: FileInfo) -> int:
-        return int(fileinfo.when.year * 12 + fileinfo.when.month)
+        when = fileinfo.when  # computed on each access
+        return int(when.year * 12 + when.month)
 
     def _calc_year(self, fileinfo: FileInfo) -> int:
         return fileinfo.when.year
@@ -0,0 +1,156 @@
+#
+# Copyright 2015-2026, Liz Balbuena
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except in
+# compliance with the License. You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and limitations under the License.
+#
+from datetime import datetime, timedelta
+from os import scandir
+from os.path import isdir
+from random import Random
+from time import time
+from typing import NamedTuple
+
+from hfbr.retention import FileInfo, RetentionPlan
+
+SIMULATED_NAME_FORMAT = "%Y%m%d-%H%M%S"
+
+
+class SimulatedFile(FileInfo):
+    """A snapshot that only exists in memory, so retention plans can be tried without touching the disk."""
+
+    __slots__ = ("size",)
+
+    def __init__(self, timestamp: float, size: int) -> None:
+        name = datetime.fromtimestamp(timestamp).strftime(SIMULATED_NAME_FORMAT) + ".bz2"
+        super().__init__("", name, (), timestamp)
+        self.size = size
+
+
+class Sample(NamedTuple):
+    when: datetime
+    written: int
+    written_bytes: int
+    kept: int
+    kept_bytes: int
+
+
+class SimulationResult:
+    def __init__(self) -> None:
+        self.samples: list[Sample] = []
+        self.kept: list[SimulatedFile] = []
+        self.written = 0
+        self.written_bytes = 0
+
+    def sample(self, when: float) -> None:
+        kept_bytes = sum(f.size for f in self.kept)
+        self.samples.append(
+            Sample(datetime.fromtimestamp(when), self.written, self.written_bytes, len(self.kept), kept_bytes)
+        )
+
+
+def synthetic_timeline(
+    duration: timedelta,
+    interval: timedelta,
+    change_rate: float = 1.0,
+    size: int = 1024 * 1024,
+    start: float | None = None,
+    seed: int | None = None,
+) -> list[tuple[float, int]]:
+    """Generate (timestamp, size) snapshots as a cron job running every `interval` would, with a given change rate."""
+    start = time() if start is None else start
+    step = interval.total_seconds()
+    ticks = int(duration.total_seconds() / step)
+    rng = Random(seed)
+    return [(start + i * step, size) for i in range(ticks) if change_rate >= 1 or rng.random() < change_rate]
+
+
+def recorded_timeline(path: str) -> list[tuple[float, int]]:
+    """Read (timestamp, size) snapshots from a backup directory, or from a text file of `timestamp [size]` lines.
+
+    Timestamps in text files are either epoch seconds or snapshot-style dates such as 20150717-1155.
+    """
+    if isdir(path):
+        with scandir(path) as entries:
+            return [(e.stat().st_mtime, e.stat().st_size) for e in entries if e.name.endswith(".bz2")]
+    timeline = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            timeline.append((_parse_timestamp(fields[0]), int(fields[1]) if len(fields) > 1 else 0))
+    return timeline
+
+
+def _parse_timestamp(value: str) -> float:
+    for fmt in ("%Y%m%d-%H%M%S", "%Y%m%d-%H%M"):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            pass
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value!r}. Expected epoch seconds or a date like 20150717-1155.")
+
+
+def simulate(
+    plan: RetentionPlan,
+    timeline: list[tuple[float, int]],
+    report_every: timedelta | None = None,
+    replay: bool = True,
+) -> SimulationResult:
+    """Replay a timeline of snapshots, applying the retention plan after each one like a real run would.
+
+    Only retained snapshots are held between steps, so the cost of each step is bounded by the plan, not the timeline.
+    Without `replay`, the plan is applied once to the whole timeline, as the next run on a backup directory would.
+    """
+    result = SimulationResult()
+    timeline = sorted(timeline)
+    if not replay:
+        result.kept = [SimulatedFile(timestamp, size) for timestamp, size in timeline]
+        result.written = len(timeline)
+        result.written_bytes = sum(size for _, size in timeline)
+        if plan.limited:
+            plan.muster(result.kept)
+            result.kept = [f for f in result.kept if f.pinned]
+        if timeline:
+            result.sample(timeline[-1][0])
+        return result
+    step = report_every.total_seconds() if report_every else 0
+    next_report = timeline[0][0] + step if timeline and step else float("inf")
+    for timestamp, size in timeline:
+        while timestamp >= next_report:
+            result.sample(next_report)
+            next_report += step
+        result.kept.insert(0, SimulatedFile(timestamp, size))
+        result.written += 1
+        result.written_bytes += size
+        if plan.limited:
+            for file in result.kept:
+                file.pinned = False
+            plan.muster(result.kept)
+            result.kept = [f for f in result.kept if f.pinned]
+    if timeline:
+        result.sample(timeline[-1][0])
+    return result
+
+
+def diff_kept(ours: list[SimulatedFile], theirs: list[SimulatedFile]) -> list[str]:
+    """Compare two sets of retained snapshots, newest first: `-` is only kept by ours, `+` only by theirs."""
+    ours_by_time = {f.timestamp: f for f in ours}
+    theirs_by_time = {f.timestamp: f for f in theirs}
+    lines = []
+    for timestamp in sorted(ours_by_time.keys() ^ theirs_by_time.keys(), reverse=True):
+        if timestamp in ours_by_time:
+            lines.append("- " + str(ours_by_time[timestamp]))
+        else:
+            lines.append("+ " + str(theirs_by_time[timestamp]))
+    return lines
@@ -0,0 +1,155 @@
+from hashlib import md5, sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.etree.ElementTree import Element, SubElement, fromstring, tostring
+
+import pytest
+
+
+class FakeS3:
+    """Just enough of the S3 API, kept in memory, to stand in for an object store."""
+
+    def __init__(self) -> None:
+        self.objects: dict[str, bytes] = {}
+        self.uploads: dict[str, tuple[str, dict[int, bytes]]] = {}
+        self.requests: list[tuple[str, str, dict]] = []
+        self.connections = 0
+        self.fail_parts: set[int] = set()
+        self.page_size = 1000
+        self.html = False  # answer like a captive portal or misconfigured proxy would
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    s3: FakeS3
+
+    def setup(self) -> None:
+        super().setup()
+        self.s3.connections += 1
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        _, query, _ = self._parse()
+        s3 = self.s3
+        if s3.html:
+            return self._reply(200, b"<html><body>Please log in<br></body></html>")
+        if "uploadId" in query:
+            root = Element("ListPartsResult")
+            marker = int(query.get("part-number-marker", "0"))
+            parts = [(n, data) for n, data in sorted(s3.uploads[query["uploadId"]][1].items()) if n > marker]
+            for number, data in parts[: s3.page_size]:
+                part = SubElement(root, "Part")
+                SubElement(part, "PartNumber").text = str(number)
+                SubElement(part, "ETag").text = _etag(data)
+                SubElement(part, "Size").text = str(len(data))
+            SubElement(root, "IsTruncated").text = "true" if len(parts) > s3.page_size else "false"
+            if len(parts) > s3.page_size:
+                SubElement(root, "NextPartNumberMarker").text = str(parts[s3.page_size - 1][0])
+        elif "uploads" in query:
+            root = Element("ListMultipartUploadsResult")
+            marker = (query.get("key-marker", ""), query.get("upload-id-marker", ""))
+            uploads = sorted(
+                (upload_key, upload_id)
+                for upload_id, (upload_key, _) in s3.uploads.items()
+                if upload_key.startswith(query.get("prefix", "")) and (upload_key, upload_id) > marker
+            )
+            for upload_key, upload_id in uploads[: s3.page_size]:
+                upload = SubElement(root, "Upload")
+                SubElement(upload, "Key").text = upload_key
+                SubElement(upload, "UploadId").text = upload_id
+            SubElement(root, "IsTruncated").text = "true" if len(uploads) > s3.page_size else "false"
+            if len(uploads) > s3.page_size:
+                SubElement(root, "NextKeyMarker").text = uploads[s3.page_size - 1][0]
+                SubElement(root, "NextUploadIdMarker").text = uploads[s3.page_size - 1][1]
+        else:
+            root = Element("ListBucketResult", xmlns="http://s3.amazonaws.com/doc/2006-03-01/")
+            keys = sorted(k for k in s3.objects if k.startswith(query.get("prefix", "")))
+            start = int(query.get("continuation-token", "0"))
+            for k in keys[start : start + s3.page_size]:
+                item = SubElement(root, "Contents")
+                SubElement(item, "Key").text = k
+                SubElement(item, "Size").text = str(len(s3.objects[k]))
+            truncated = start + s3.page_size < len(keys)
+            SubElement(root, "IsTruncated").text = "true" if truncated else "false"
+            if truncated:
+                SubElement(root, "NextContinuationToken").text = str(start + s3.page_size)
+        self._reply(200, tostring(root))
+
+    def do_PUT(self) -> None:
+        key, query, body = self._parse()
+        s3 = self.s3
+        if "partNumber" in query:
+            number = int(query["partNumber"])
+            if number in s3.fail_parts:
+                s3.fail_parts.discard(number)
+                return self._reply(500, b"<Error>injected</Error>")
+            s3.uploads[query["uploadId"]][1][number] = body
+        else:
+            s3.objects[key] = body
+        self._reply(200, b"", {"ETag": _etag(body)})
+
+    def do_POST(self) -> None:
+        key, query, body = self._parse()
+        s3 = self.s3
+        root = Element("Result")
+        if "uploads" in query:
+            upload_id = f"upload-{len(s3.requests)}"
+            s3.uploads[upload_id] = (key, {})
+            SubElement(root, "UploadId").text = upload_id
+        elif "uploadId" in query:
+            upload_key, parts = s3.uploads.pop(query["uploadId"])
+            numbers = [int(p.findtext("PartNumber", "")) for p in fromstring(body).iter("Part")]
+            etags = [p.findtext("ETag") for p in fromstring(body).iter("Part")]
+            assert etags == [_etag(parts[n]) for n in numbers]
+            s3.objects[upload_key] = b"".join(parts[n] for n in numbers)
+        elif "delete" in query:
+            assert self.headers["content-md5"]
+            for k in fromstring(body).iter("Key"):
+                s3.objects.pop(k.text or "", None)
+        self._reply(200, tostring(root))
+
+    def do_DELETE(self) -> None:
+        key, query, _ = self._parse()
+        if "uploadId" in query:
+            assert self.s3.uploads.pop(query["uploadId"])[0] == key
+        else:
+            self.s3.objects.pop(key, None)
+        self._reply(204, b"")
+
+    def _parse(self) -> tuple[str, dict[str, str], bytes]:
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        assert self.headers["authorization"].startswith("AWS4-HMAC-SHA256 Credential=")
+        assert self.headers["x-amz-content-sha256"] == sha256(body).hexdigest()
+        bucket, _, key = unquote(url.path).lstrip("/").partition("/")
+        assert bucket == "bucket"
+        self.s3.requests.append((self.command, key, query))
+        return key, query, body
+
+    def _reply(self, status: int, body: bytes, headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _etag(data: bytes) -> str:
+    return f'"{md5(data).hexdigest()}"'
+
+
+@pytest.fixture
+def s3_server():
+    """Run an in-process fake S3 server, yielding its endpoint URL and state."""
+    s3 = FakeS3()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), type("Handler", (FakeS3Handler,), {"s3": s3}))
+    thread = Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", s3
+    server.shutdown()
+    server.server_close()
@@ -1,8 +1,20 @@
 import bz2
+import os
+import time
+from datetime import timedelta
 from hashlib import sha512
 from io import BytesIO
 
-from hfbr.backup import backup_and_retention, backup_target_database, block_transfer
+import pytest
+
+from hfbr.backup import (
+    atomic_path,
+    backup_and_retention,
+    backup_target_database,
+    block_transfer,
+    remove_partial_files,
+    target_lock,
+)
 from hfbr.retention import RetentionPlan
 
 # ── block_transfer ──────────────────────────────────────────────────────────
@@ -95,11 +107,120 @@ class TestBackupTargetDatabase:
         assert len(snapshots) == 1
         assert ".sqlite.bz2" in snapshots[0].name
 
+    def test_adaptive_skips_superseded_change(self, tmp_path):
+        target = tmp_path / "data.db"
+        target.write_bytes(b"old content")
+        backup_dir = tmp_path / "backups"
+        backup_dir.mkdir()
+        plan = RetentionPlan(((timedelta(weeks=1000), 5),))
+
+        assert backup_target_database(str(target), str(backup_dir), plan)
+        target.write_bytes(b"new content")
+        assert backup_target_database(str(target), str(backup_dir), plan) is None
+        assert len(list(backup_dir.glob("*.bz2"))) == 1
+        # not marked as saved, so it is saved once the plan no longer supersedes it
+        assert (backup_dir / "last_hash").read_bytes() == sha512(b"old content").digest()
+
+    def test_adaptive_min_interval(self, tmp_path):
+        target = tmp_path / "data.db"
+        target.write_bytes(b"old content")
+        backup_dir = tmp_path / "backups"
+        backup_dir.mkdir()
+        snapshot = backup_dir / "20260101-1200.db.bz2"
+        snapshot.write_bytes(b"x")
+        hour_ago = time.time() - 3600
+        os.utime(snapshot, (hour_ago, hour_ago))
+        plan = RetentionPlan(((timedelta(weeks=1000), 5), (None, 10)))
+
+        assert backup_target_database(str(target), str(backup_dir), plan, timedelta(hours=2)) is None
+        assert backup_target_database(str(target), str(backup_dir), plan, timedelta(minutes=20))
+
+    def test_failed_snapshot_leaves_no_partial_file(self, tmp_path, monkeypatch):
+        target = tmp_path / "data.db"
+        target.write_bytes(b"content")
+        backup_dir = tmp_path / "backups"
+        backup_dir.mkdir()
+
+        def failing_transfer(fread, fwrite, **kwargs):
+            fwrite(fread(3))
+            raise OSError("disk full")
+
+        monkeypatch.setattr("hfbr.backup.block_transfer", failing_transfer)
+        with pytest.raises(OSError, match="disk full"):
+            backup_target_database(str(target), str(backup_dir))
+        assert list(backup_dir.iterdir()) == []
+
+
+# ── atomic_path ─────────────────────────────────────────────────────────────
+
+
+class TestAtomicPath:
+    def test_renames_when_done(self, tmp_path):
+        path = tmp_path / "file.bz2"
+        with atomic_path(str(path)) as temp_path:
+            with open(temp_path, "wb") as f:
+                f.write(b"data")
+            assert not path.exists()
+        assert path.read_bytes() == b"data"
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_unique_temporary_paths(self, tmp_path):
+        path = tmp_path / "file.bz2"
+        with atomic_path(str(path)) as first, atomic_path(str(path)) as second:
+            assert first != second
+            assert first.endswith(".tmp")
+
+    def test_permissions_follow_umask(self, tmp_path):
+        path = tmp_path / "file.bz2"
+        mask = os.umask(0o022)
+        try:
+            with atomic_path(str(path)):
+                pass
+        finally:
+            os.umask(mask)
+        assert path.stat().st_mode & 0o777 == 0o644
+
+    def test_removes_partial_files(self, tmp_path):
+        (tmp_path / "partial-abc123.tmp").write_bytes(b"half a snapshot")
+        (tmp_path / "other.tmp").write_bytes(b"not ours")
+        (tmp_path / "a.bz2").write_bytes(b"snapshot")
+        remove_partial_files(str(tmp_path))
+        assert sorted(f.name for f in tmp_path.iterdir()) == ["a.bz2", "other.tmp"]
+
+    def test_replaces_existing(self, tmp_path):
+        path = tmp_path / "last_hash"
+        path.write_bytes(b"old")
+        with atomic_path(str(path)) as temp_path, open(temp_path, "wb") as f:
+            f.write(b"new")
+        assert path.read_bytes() == b"new"
+
+
+# ── target_lock ─────────────────────────────────────────────────────────────
+
+
+class TestTargetLock:
+    def test_acquires_free_lock(self, tmp_path):
+        with target_lock(str(tmp_path)) as locked:
+            assert locked
+
+    def test_busy_lock(self, tmp_path):
+        with target_lock(str(tmp_path)) as locked:
+            assert locked
+            with target_lock(str(tmp_path)) as again:
+                assert not again
+        with target_lock(str(tmp_path)) as locked:
+            assert locked
+
 
 # ── backup_and_retention ────────────────────────────────────────────────────
 
 
 class TestBackupAndRetention:
+    def test_removes_partial_files_of_killed_runs(self, tmp_path):
+        (tmp_path / "partial-abc123.tmp").write_bytes(b"half a snapshot")
+        backup_and_retention(backup_dir=str(tmp_path))
+        assert not (tmp_path / "partial-abc123.tmp").exists()
+
     def test_no_target_or_backup_dir_logs_error(self):
         # Should not raise, just log an error and return
         backup_and_retention(target_path="", backup_dir="")
@@ -142,6 +263,20 @@ class TestBackupAndRetention:
         plan = RetentionPlan()
         backup_and_retention(target_path=str(target), backup_dir=str(backup_dir), retention_plan=plan)
 
+    def test_busy_target_is_skipped(self, tmp_path, caplog):
+        target = tmp_path / "data.db"
+        target.write_bytes(b"content")
+        backup_dir = tmp_path / "backups"
+        backup_dir.mkdir()
+
+        with target_lock(str(backup_dir)):
+            backup_and_retention(target_path=str(target), backup_dir=str(backup_dir))
+        assert "another run is still busy" in caplog.text
+        assert list(backup_dir.glob("*.bz2")) == []
+
+        backup_and_retention(target_path=str(target), backup_dir=str(backup_dir))
+        assert len(list(backup_dir.glob("*.bz2"))) == 1
+
     def test_backup_dir_only_runs_retention(self, tmp_path):
         backup_dir = tmp_path / "backups"
         backup_dir.mkdir()
@@ -0,0 +1,153 @@
+import os
+import time
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+from threading import Thread
+
+import pytest
+
+from hfbr.backup import backup_and_retention
+from hfbr.feed import ChangeFeed, FeedRequestHandler
+from hfbr.retention import RetentionPlan
+
+# ── ChangeFeed ──────────────────────────────────────────────────────────────
+
+
+class TestChangeFeed:
+    def test_append_numbers_lines(self, tmp_path):
+        feed = ChangeFeed(str(tmp_path))
+        feed.append(["a.bz2"])
+        feed.append(["b.bz2"], ["a.bz2"])
+        assert (tmp_path / "changes").read_text() == "1\tadd\ta.bz2\n2\tadd\tb.bz2\n3\tprune\ta.bz2\n"
+        assert feed.last_sequence() == 3
+
+    def test_new_feed_records_existing_snapshots(self, tmp_path):
+        old = tmp_path / "old.bz2"
+        old.write_bytes(b"x")
+        os.utime(old, (time.time() - 100, time.time() - 100))
+        (tmp_path / "new.bz2").write_bytes(b"x")
+        feed = ChangeFeed(str(tmp_path))
+        feed.append(["new.bz2"])
+        assert feed.read_since(0) == b"1\tadd\told.bz2\n2\tadd\tnew.bz2\n"
+
+    def test_nothing_to_append(self, tmp_path):
+        feed = ChangeFeed(str(tmp_path))
+        feed.append()
+        assert not (tmp_path / "changes").exists()
+        assert feed.last_sequence() == 0
+        assert feed.read_since(0) == b""
+
+    @pytest.mark.parametrize("since", [0, 1, 57, 299, 300, 400])
+    def test_read_since(self, tmp_path, since):
+        feed = ChangeFeed(str(tmp_path))
+        feed.append([f"{i:0{i % 7 + 1}}.bz2" for i in range(1, 301)])
+        lines = feed.read_since(since).decode().splitlines()
+        assert [int(line.split("\t")[0]) for line in lines] == list(range(since + 1, 301))
+
+    def test_partial_line_is_ignored_and_repaired(self, tmp_path):
+        feed = ChangeFeed(str(tmp_path))
+        feed.append(["a.bz2"])
+        with open(tmp_path / "changes", "ab") as f:
+            f.write(b"2\tadd\tb.b")
+        assert feed.read_since(0) == b"1\tadd\ta.bz2\n"
+        assert feed.last_sequence() == 1
+
+        feed.append(["c.bz2"])
+        assert feed.read_since(0) == b"1\tadd\ta.bz2\n2\tadd\tc.bz2\n"
+
+
+# ── backup_and_retention ────────────────────────────────────────────────────
+
+
+class TestBackupAndRetentionFeed:
+    def test_records_added_and_pruned(self, tmp_path):
+        target = tmp_path / "data.db"
+        target.write_bytes(b"content")
+        backup_dir = tmp_path / "backups"
+        backup_dir.mkdir()
+        old = backup_dir / "old.bz2"
+        old.write_bytes(b"x")
+        os.utime(old, (time.time() - 86400, time.time() - 86400))
+        ChangeFeed(str(backup_dir)).append()
+
+        plan = RetentionPlan(((None, 1),))
+        backup_and_retention(str(target), str(backup_dir), plan, feed=True)
+        lines = [line.split("\t") for line in (backup_dir / "changes").read_text().splitlines()]
+        assert [(line[0], line[1]) for line in lines] == [("1", "add"), ("2", "add"), ("3", "prune")]
+        assert lines[1][2].endswith(".db.bz2")
+        assert lines[2][2] == "old.bz2"
+
+    def test_feed_is_opt_in(self, tmp_path):
+        target = tmp_path / "data.db"
+        target.write_bytes(b"content")
+        backup_and_retention(str(target))
+        assert not (tmp_path / "changes").exists()
+
+
+# ── FeedRequestHandler ──────────────────────────────────────────────────────
+
+
+@pytest.fixture
+def feed_server(tmp_path):
+    feed = ChangeFeed(str(tmp_path))
+    handler = type("Handler", (FeedRequestHandler,), {"feeds": {"db": feed}})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+    yield HTTPConnection("127.0.0.1", server.server_address[1]), feed
+    server.shutdown()
+    server.server_close()
+
+
+class TestFeedRequestHandler:
+    def test_changes_since(self, tmp_path, feed_server):
+        connection, feed = feed_server
+        feed.append(["a.bz2", "b.bz2", "c.bz2"])
+        connection.request("GET", "/db/changes?since=2")
+        response = connection.getresponse()
+        assert response.status == 200
+        assert response.getheader("X-Hfbr-Sequence") == "3"
+        assert response.read() == b"3\tadd\tc.bz2\n"
+
+    def test_sequence_matches_body(self, feed_server, monkeypatch):
+        connection, feed = feed_server
+        feed.append(["a.bz2"])
+        read_since = feed.read_since
+
+        def read_then_append(since):
+            data = read_since(since)
+            feed.append(["b.bz2"])
+            return data
+
+        monkeypatch.setattr(feed, "read_since", read_then_append)
+        connection.request("GET", "/db/changes?since=0")
+        response = connection.getresponse()
+        assert response.read() == b"1\tadd\ta.bz2\n"
+        assert response.getheader("X-Hfbr-Sequence") == "1"
+
+    def test_nothing_new(self, feed_server):
+        connection, feed = feed_server
+        feed.append(["a.bz2"])
+        connection.request("GET", "/db/changes?since=1")
+        response = connection.getresponse()
+        assert response.read() == b""
+        assert response.getheader("X-Hfbr-Sequence") == "1"
+
+    def test_invalid_since(self, feed_server):
+        connection, _ = feed_server
+        connection.request("GET", "/db/changes?since=x")
+        assert connection.getresponse().status == 400
+
+    def test_snapshot(self, tmp_path, feed_server):
+        connection, _ = feed_server
+        (tmp_path / "a.bz2").write_bytes(b"snapshot")
+        connection.request("GET", "/db/a.bz2")
+        response = connection.getresponse()
+        assert response.status == 200
+        assert response.read() == b"snapshot"
+
+    @pytest.mark.parametrize("path", ["/other/changes", "/db/missing.bz2", "/db/last_hash", "/db/../etc/passwd"])
+    def test_not_found(self, tmp_path, feed_server, path):
+        connection, _ = feed_server
+        (tmp_path / "last_hash").write_bytes(b"x")
+        connection.request("GET", path)
+        assert connection.getresponse().status == 404
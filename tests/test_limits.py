@@ -0,0 +1,139 @@
+import logging
+import os
+from io import BytesIO
+
+import pytest
+
+from hfbr.backup import backup_target_database, block_transfer
+from hfbr.limits import Limits, ThrottledWriter, TokenBucket, TransferStats, set_priority
+
+
+class FakeClock:
+    def __init__(self, monkeypatch):
+        self.now = 0.0
+        monkeypatch.setattr("hfbr.limits.monotonic", lambda: self.now)
+        monkeypatch.setattr("hfbr.limits.sleep", self.sleep)
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+# ── TokenBucket ─────────────────────────────────────────────────────────────
+
+
+class TestTokenBucket:
+    def test_allows_burst(self, monkeypatch):
+        clock = FakeClock(monkeypatch)
+        bucket = TokenBucket(1000)
+        bucket.consume(1000)
+        assert clock.now == 0
+        assert bucket.throttled == 0
+
+    def test_limits_rate(self, monkeypatch):
+        clock = FakeClock(monkeypatch)
+        bucket = TokenBucket(1000)
+        for _ in range(10):
+            bucket.consume(500)
+        assert clock.now == pytest.approx(4)
+        assert bucket.throttled == pytest.approx(4)
+
+    def test_refills_over_time(self, monkeypatch):
+        clock = FakeClock(monkeypatch)
+        bucket = TokenBucket(1000)
+        bucket.consume(1000)
+        clock.now += 10
+        bucket.consume(1000)
+        assert bucket.throttled == 0
+
+
+class TestThrottledWriter:
+    def test_writes_through(self, monkeypatch):
+        FakeClock(monkeypatch)
+        raw = BytesIO()
+        bucket = TokenBucket(2)
+        writer = ThrottledWriter(raw, bucket)
+        writer.write(b"abcd")
+        writer.flush()
+        assert raw.getvalue() == b"abcd"
+        assert bucket.throttled == pytest.approx(1)
+
+
+class TestBlockTransferThrottle:
+    def test_throttle_gets_block_sizes(self):
+        sizes = []
+        dst = BytesIO()
+        copied = block_transfer(BytesIO(b"x" * 2500).read, dst.write, length=1000, throttle=sizes.append)
+        assert sizes == [1000, 1000, 500]
+        assert copied == 2500
+
+
+# ── Limits ──────────────────────────────────────────────────────────────────
+
+
+class TestLimits:
+    def test_no_limits(self):
+        limits = Limits()
+        assert limits.read_bucket() is None
+        assert limits.write_bucket() is None
+
+    def test_buckets(self):
+        limits = Limits(read_rate=100, write_rate=50)
+        reads, writes = limits.read_bucket(), limits.write_bucket()
+        assert reads and reads.rate == 100
+        assert writes and writes.rate == 50
+
+    @pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="needs posix_fadvise")
+    def test_fadvise(self, tmp_path, monkeypatch):
+        advice = []
+        monkeypatch.setattr("os.posix_fadvise", lambda fd, offset, length, hint: advice.append(hint))
+        path = tmp_path / "file"
+        path.write_bytes(b"x")
+        limits = Limits(fadvise=True)
+        with open(path, "rb") as f:
+            limits.advise_read(f)
+        with open(path, "ab") as f:
+            limits.advise_written(f)
+        assert os.POSIX_FADV_SEQUENTIAL in advice
+        assert advice[-1] == os.POSIX_FADV_DONTNEED
+
+    def test_backup_with_limits(self, tmp_path, monkeypatch, caplog):
+        FakeClock(monkeypatch)
+        target = tmp_path / "data.db"
+        target.write_bytes(os.urandom(64 * 1024))
+        limits = Limits(read_rate=16 * 1024, write_rate=16 * 1024, fadvise=True)
+
+        with caplog.at_level(logging.DEBUG, logger="hfbr.limits"):
+            assert backup_target_database(str(target), str(tmp_path), limits=limits)
+        assert "Hashed 65536 bytes" in caplog.text
+        assert "Compressed 65536 bytes" in caplog.text
+        assert "throttled for 3." in caplog.text
+
+
+class TestTransferStats:
+    def test_logs_throughput(self, caplog):
+        bucket = TokenBucket(1)
+        with caplog.at_level(logging.DEBUG, logger="hfbr.limits"), TransferStats("Copied", bucket, None) as stats:
+            stats.bytes = 42
+            bucket.throttled += 2
+        assert "Copied 42 bytes" in caplog.text
+        assert "throttled for 2.000s" in caplog.text
+
+
+# ── set_priority ────────────────────────────────────────────────────────────
+
+
+class TestSetPriority:
+    def test_nice(self, monkeypatch):
+        increments = []
+        monkeypatch.setattr("os.nice", increments.append)
+        set_priority(nice=5)
+        assert increments == [5]
+
+    def test_invalid_ioprio(self):
+        with pytest.raises(ValueError, match="Invalid ioprio"):
+            set_priority(ioprio="realtime")
+
+    def test_unsupported_platform(self, monkeypatch, caplog):
+        monkeypatch.setattr("hfbr.limits.machine", lambda: "vax")
+        set_priority(ioprio=7)
+        assert "not supported" in caplog.text
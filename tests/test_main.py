@@ -1,7 +1,10 @@
+from datetime import timedelta
+
 import pytest
 import yaml
 
-from hfbr.main import Settings, main
+from hfbr.main import Settings, main, plan_sim, serve
+from hfbr.remote import S3Remote
 from hfbr.retention import RetentionPlan
 
 # ── Settings ────────────────────────────────────────────────────────────────
@@ -48,6 +51,47 @@ class TestSettings:
         settings = Settings(["-c", str(config_file)])
         assert isinstance(settings[0]["retention_plan"], RetentionPlan)
 
+    def test_from_yaml_with_min_interval(self, tmp_path):
+        config = {"targets": [{"target_path": "/some/path", "adaptive": True, "min_interval": "2 hours"}]}
+        config_file = tmp_path / "settings.yaml"
+        config_file.write_text(yaml.dump(config))
+
+        settings = Settings(["-c", str(config_file)])
+        assert settings[0]["min_interval"] == timedelta(hours=2)
+
+    def test_from_yaml_with_limits(self, tmp_path):
+        config = {
+            "limits": {"nice": 10, "ioprio": "idle", "read_rate": 1000, "fadvise": True},
+            "targets": [{"target_path": "/some/path", "limits": {"read_rate": 500}}, {"target_path": "/other/path"}],
+        }
+        config_file = tmp_path / "settings.yaml"
+        config_file.write_text(yaml.dump(config))
+
+        settings = Settings(["-c", str(config_file)])
+        assert settings.priority == {"nice": 10, "ioprio": "idle"}
+        assert settings[0]["limits"].read_rate == 500
+        assert settings[1]["limits"].read_rate == 1000
+        assert settings[1]["limits"].write_rate is None
+
+    @pytest.mark.parametrize("name", ["nice", "ioprio"])
+    def test_priority_in_target_limits(self, tmp_path, name):
+        config = {"targets": [{"target_path": "/some/path", "limits": {name: 5}}]}
+        config_file = tmp_path / "settings.yaml"
+        config_file.write_text(yaml.dump(config))
+
+        with pytest.raises(ValueError, match="only allowed in the top-level limits"):
+            Settings(["-c", str(config_file)])
+
+    def test_creates_profile_dir(self, tmp_path):
+        settings = Settings(["--profile", "cprofile", "--profile-dir", str(tmp_path / "profiles"), "/some/path"])
+        assert settings.profile_dir == str(tmp_path / "profiles")
+        assert (tmp_path / "profiles").is_dir()
+
+    def test_invalid_profile_dir_exits(self, tmp_path):
+        (tmp_path / "file").write_text("")
+        with pytest.raises(SystemExit):
+            Settings(["--profile", "tracemalloc", "--profile-dir", str(tmp_path / "file" / "profiles"), "/some/path"])
+
     def test_from_yaml_with_logging(self, tmp_path):
         config = {
             "logging": {
@@ -134,6 +178,18 @@ class TestMain:
         # Verify backup was created
         assert (tmp_path / "last_hash").exists()
 
+    def test_main_profiles_targets(self, tmp_path, monkeypatch, caplog):
+        target = tmp_path / "data.db"
+        target.write_bytes(b"content")
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr("sys.argv", ["hfbr", "--profile", "cprofile", "--profile-dir", str(tmp_path), str(target)])
+        caplog.set_level("INFO")
+
+        main()
+        assert (tmp_path / "01-data.db.prof").exists()
+        assert "(hash " in caplog.text
+        assert "compress " in caplog.text
+
     def test_main_multiple_targets(self, tmp_path, monkeypatch):
         t1 = tmp_path / "a.db"
         t2 = tmp_path / "b.db"
@@ -157,3 +213,127 @@ class TestMain:
         main()
         assert (backup1 / "last_hash").exists()
         assert (backup2 / "last_hash").exists()
+
+
+# ── plan_sim ────────────────────────────────────────────────────────────────
+
+
+class TestPlanSim:
+    def test_named_plans_with_diff(self, tmp_path, capsys):
+        config = {"plans": {"short": [["1 day", 2]], "long": [["1 day", 5]]}}
+        config_file = tmp_path / "settings.yaml"
+        config_file.write_text(yaml.dump(config))
+
+        plan_sim(["-c", str(config_file), "short", "long", "--duration", "10 days", "--interval", "1 hour"])
+        out = capsys.readouterr().out
+        assert "Plan short: 240 snapshots written, 2 kept" in out
+        assert "Plan long: 240 snapshots written, 5 kept" in out
+        assert out.count("\n+ ") == 3
+
+    def test_inline_plan_on_recorded_timeline(self, tmp_path, capsys, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        recorded = tmp_path / "timeline.txt"
+        recorded.write_text("20260101-1200 10\n20260101-1300 10\n20260102-1200 10\n")
+
+        plan_sim(["[[1 day, 1]]", "--timeline", str(recorded), "--once"])
+        out = capsys.readouterr().out
+        assert "3 snapshots written, 1 kept" in out
+        assert "---" not in out
+
+    def test_invalid_duration(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        with pytest.raises(ValueError, match="Invalid duration"):
+            plan_sim(["[[null, 1]]", "--interval", "month"])
+
+    def test_unknown_plan(self, tmp_path, monkeypatch):
+        config_file = tmp_path / "settings.yaml"
+        config_file.write_text("plans:\n  important: [[null, 10]]\n")
+        with pytest.raises(ValueError, match="Unknown plan: 'importnt'.*important"):
+            plan_sim(["-c", str(config_file), "importnt"])
+
+    def test_main_dispatches_command(self, tmp_path, capsys, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr("sys.argv", ["hfbr", "plan-sim", "[[null, 3]]", "--duration", "1 day"])
+        main()
+        assert "72 snapshots written, 3 kept" in capsys.readouterr().out
+
+
+class TestSettingsRemote:
+    def test_named_and_inline_remotes(self, tmp_path):
+        remote = {"endpoint": "http://localhost:9000", "bucket": "backups"}
+        config = {
+            "remotes": {"minio": remote},
+            "targets": [
+                {"target_path": "/some/path", "remote": "minio"},
+                {"target_path": "/other/path", "remote": {**remote, "prefix": "other/"}},
+            ],
+        }
+        config_file = tmp_path / "settings.yaml"
+        config_file.write_text(yaml.dump(config))
+
+        settings = Settings(["-c", str(config_file)])
+        assert isinstance(settings[0]["remote"], S3Remote)
+        assert settings[0]["remote"].prefix == "some/"
+        assert settings[1]["remote"].prefix == "other/"
+
+    def test_shared_remote_namespaces(self, tmp_path):
+        remote = {"endpoint": "http://localhost:9000", "bucket": "backups", "prefix": "offsite/"}
+        config = {
+            "remotes": {"minio": remote},
+            "targets": [
+                {"target_path": "/a/data.sq3", "backup_dir": "/backups/a", "remote": "minio"},
+                {"target_path": "/b/data.sq3", "backup_dir": "/backups/b", "remote": "minio"},
+                {"target_path": "/c/data.sq3", "backup_dir": "/backups/b", "remote": "minio"},
+            ],
+        }
+        config_file = tmp_path / "settings.yaml"
+        config_file.write_text(yaml.dump(config))
+
+        settings = Settings(["-c", str(config_file)])
+        assert [item["remote"].prefix for item in settings] == ["offsite/a/", "offsite/b/", "offsite/b/"]
+
+    def test_colliding_remote_namespaces(self, tmp_path):
+        config = {
+            "remotes": {"minio": {"endpoint": "http://localhost:9000", "bucket": "backups"}},
+            "targets": [
+                {"target_path": "/a/data.sq3", "backup_dir": "/one/db", "remote": "minio"},
+                {"target_path": "/b/data.sq3", "backup_dir": "/two/db", "remote": "minio"},
+            ],
+        }
+        config_file = tmp_path / "settings.yaml"
+        config_file.write_text(yaml.dump(config))
+
+        with pytest.raises(ValueError, match="would share the remote prefix 'db/'"):
+            Settings(["-c", str(config_file)])
+
+
+# ── serve ───────────────────────────────────────────────────────────────────
+
+
+class TestServe:
+    def test_no_feeds_exits(self, tmp_path):
+        config_file = tmp_path / "settings.yaml"
+        config_file.write_text(yaml.dump({"targets": [{"backup_dir": str(tmp_path)}]}))
+        with pytest.raises(SystemExit):
+            serve(["-c", str(config_file)])
+
+    def test_serves_targets_with_feed(self, tmp_path, monkeypatch):
+        backup_dir = tmp_path / "kindness"
+        config_file = tmp_path / "settings.yaml"
+        config_file.write_text(yaml.dump({"targets": [{"backup_dir": str(backup_dir), "feed": True}]}))
+        served = {}
+
+        def serve_forever(server):
+            served.update(server.RequestHandlerClass.feeds)
+
+        monkeypatch.setattr("http.server.ThreadingHTTPServer.serve_forever", serve_forever)
+        serve(["-c", str(config_file), "--port", "0"])
+        assert served["kindness"].backup_dir == str(backup_dir)
+
+    def test_duplicate_feed_names_exit(self, tmp_path, caplog):
+        targets = [{"backup_dir": str(tmp_path / parent / "db"), "feed": True} for parent in ("a", "b")]
+        config_file = tmp_path / "settings.yaml"
+        config_file.write_text(yaml.dump({"targets": targets}))
+        with pytest.raises(SystemExit):
+            serve(["-c", str(config_file)])
+        assert "would be served as /db/" in caplog.text
@@ -0,0 +1,73 @@
+import pstats
+import tracemalloc
+
+import pytest
+
+from hfbr import profiling
+from hfbr.profiling import profile, span
+
+
+class TestSpan:
+    def test_no_op_when_not_profiling(self):
+        with span("hash"):
+            pass
+        assert profiling._spans is None
+
+    def test_accumulates_while_profiling(self, caplog):
+        caplog.set_level("INFO")
+        with profile("spans", "target"):
+            for _ in range(2):
+                with span("hash"):
+                    pass
+            with span("muster"):
+                pass
+        assert "Profile of target" in caplog.text
+        assert "(hash 0.0" in caplog.text
+        assert "muster 0.0" in caplog.text
+        assert profiling._spans is None
+
+
+class TestProfile:
+    def test_disabled(self, tmp_path):
+        with profile(None, "target", str(tmp_path)):
+            pass
+        assert list(tmp_path.iterdir()) == []
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError, match="Invalid profile mode"), profile("perf", "target"):
+            pass
+
+    def test_cprofile(self, tmp_path, caplog):
+        caplog.set_level("INFO")
+        with profile("cprofile", "01-target", str(tmp_path), top=5):
+            sorted(range(1000), key=str)
+        stats = pstats.Stats(str(tmp_path / "01-target.prof"))
+        assert stats.get_stats_profile().func_profiles
+        assert "Top 5 by cumulative time" in caplog.text
+
+    def test_tracemalloc(self, tmp_path, caplog):
+        caplog.set_level("INFO")
+        with profile("tracemalloc", "01-target", str(tmp_path), top=3):
+            data = [bytes(1000) for _ in range(100)]
+        assert data
+        assert not tracemalloc.is_tracing()
+        snapshot = tracemalloc.Snapshot.load(str(tmp_path / "01-target.tracemalloc"))
+        assert snapshot.statistics("lineno")
+        assert "top 3 still allocated" in caplog.text
+
+    @pytest.mark.parametrize("mode", ["cprofile", "tracemalloc"])
+    def test_failed_dump_logs_error(self, tmp_path, caplog, mode):
+        with profile(mode, "target", str(tmp_path / "missing")):
+            pass
+        assert "Failed to save the profile of target" in caplog.text
+        assert not tracemalloc.is_tracing()
+
+    def test_failed_dump_keeps_target_error(self, tmp_path):
+        with pytest.raises(RuntimeError), profile("cprofile", "target", str(tmp_path / "missing")):
+            raise RuntimeError
+
+    def test_stops_on_error(self, tmp_path):
+        with pytest.raises(RuntimeError), profile("tracemalloc", "target", str(tmp_path)):
+            raise RuntimeError
+        assert not tracemalloc.is_tracing()
+        assert profiling._spans is None
@@ -0,0 +1,213 @@
+import os
+from contextlib import contextmanager
+from socketserver import StreamRequestHandler, TCPServer
+from threading import Thread
+
+import pytest
+
+from hfbr.backup import backup_and_retention
+from hfbr.remote import RemoteError, S3Remote
+
+
+def make_remote(endpoint, **kwargs):
+    return S3Remote(endpoint, "bucket", access_key="key", secret_key="secret", **kwargs)
+
+
+# ── S3Remote.push ───────────────────────────────────────────────────────────
+
+
+class TestPush:
+    def test_uploads_small_snapshots(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        (tmp_path / "a.bz2").write_bytes(b"aaa")
+        (tmp_path / "b.bz2").write_bytes(b"bbb")
+        (tmp_path / "last_hash").write_bytes(b"hash")
+
+        make_remote(endpoint, prefix="db/").push(str(tmp_path))
+        assert s3.objects == {"db/a.bz2": b"aaa", "db/b.bz2": b"bbb"}
+
+    def test_skips_snapshots_already_pushed(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        (tmp_path / "a.bz2").write_bytes(b"aaa")
+        remote = make_remote(endpoint)
+        remote.push(str(tmp_path))
+        s3.requests.clear()
+
+        remote.push(str(tmp_path))
+        assert [method for method, _, _ in s3.requests] == ["GET", "GET"]
+
+    def test_reuses_pooled_connections(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        for i in range(20):
+            (tmp_path / f"{i}.bz2").write_bytes(b"x")
+
+        make_remote(endpoint, workers=2).push(str(tmp_path))
+        assert len(s3.objects) == 20
+        assert s3.connections <= 3
+
+    def test_multipart_upload(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        data = os.urandom(10 * 1024 + 3)
+        (tmp_path / "big.bz2").write_bytes(data)
+
+        make_remote(endpoint, part_size=1024).push(str(tmp_path))
+        assert s3.objects == {"big.bz2": data}
+        assert sum(1 for _, _, query in s3.requests if "partNumber" in query) == 11
+
+    def test_multipart_upload_resumes(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        data = os.urandom(10 * 1024)
+        (tmp_path / "big.bz2").write_bytes(data)
+        remote = make_remote(endpoint, part_size=1024, workers=1)
+        s3.fail_parts = {4}
+
+        with pytest.raises(RemoteError, match="500"):
+            remote.push(str(tmp_path))
+        assert s3.objects == {}
+        s3.requests.clear()
+
+        remote.push(str(tmp_path))
+        assert s3.objects == {"big.bz2": data}
+        resent = [int(query["partNumber"]) for _, _, query in s3.requests if "partNumber" in query]
+        assert 4 in resent
+        assert 1 not in resent
+
+    def test_multipart_upload_resumes_with_paged_parts(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        data = os.urandom(10 * 1024)
+        (tmp_path / "big.bz2").write_bytes(data)
+        remote = make_remote(endpoint, part_size=1024, workers=1)
+        s3.fail_parts = {10}
+        s3.page_size = 2
+
+        with pytest.raises(RemoteError, match="500"):
+            remote.push(str(tmp_path))
+        s3.requests.clear()
+
+        remote.push(str(tmp_path))
+        assert s3.objects == {"big.bz2": data}
+        assert [int(query["partNumber"]) for _, _, query in s3.requests if "partNumber" in query] == [10]
+
+    def test_aborts_uploads_of_pruned_snapshots(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        s3.page_size = 1
+        s3.uploads = {"upload-a": ("db/gone.bz2", {1: b"x"}), "upload-b": ("db/big.bz2", {}), "upload-c": ("other", {})}
+        (tmp_path / "big.bz2").write_bytes(os.urandom(2048))
+
+        make_remote(endpoint, prefix="db/", part_size=1024).push(str(tmp_path))
+        assert s3.uploads == {"upload-c": ("other", {})}
+        assert sorted(s3.objects) == ["db/big.bz2"]
+        assert not any("uploads" in query for method, _, query in s3.requests if method == "POST")  # resumed
+
+    def test_mirrors_pruned_snapshots(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        s3.objects = {"old.bz2": b"1", "older.bz2": b"2", "other/file.bz2": b"3"}
+        (tmp_path / "new.bz2").write_bytes(b"new")
+
+        make_remote(endpoint).push(str(tmp_path), ["old.bz2", "never-pushed.bz2"])
+        assert s3.objects == {"new.bz2": b"new", "older.bz2": b"2", "other/file.bz2": b"3"}
+
+    def test_targets_sharing_a_remote(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        first, second = tmp_path / "a", tmp_path / "b"
+        first.mkdir()
+        second.mkdir()
+        (first / "20260101-1200.sq3.bz2").write_bytes(b"first")
+        (second / "20260101-1200.sq3.bz2").write_bytes(b"second!")
+        (second / "big.bz2").write_bytes(os.urandom(2048))
+        s3.uploads = {"upload-b": ("offsite/b/big.bz2", {1: b"x"})}
+        s3.fail_parts = {2}
+
+        make_remote(endpoint, prefix="offsite/a/").push(str(first))
+        with pytest.raises(RemoteError, match="500"):
+            make_remote(endpoint, prefix="offsite/b/", part_size=1024).push(str(second))
+        make_remote(endpoint, prefix="offsite/a/").push(str(first), ["20260101-1200.sq3.bz2"])
+        assert s3.objects == {"offsite/b/20260101-1200.sq3.bz2": b"second!"}
+        assert [key for key, _ in s3.uploads.values()] == ["offsite/b/big.bz2"]
+
+    def test_keeps_snapshots_missing_locally(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        s3.objects = {"old.bz2": b"1"}
+
+        make_remote(endpoint).push(str(tmp_path))
+        assert s3.objects == {"old.bz2": b"1"}
+
+    def test_deletes_in_batches(self, s3_server, tmp_path, monkeypatch):
+        endpoint, s3 = s3_server
+        monkeypatch.setattr("hfbr.remote.DELETE_BATCH", 2)
+        s3.page_size = 2
+        s3.objects = {f"{i}.bz2": b"x" for i in range(5)}
+
+        make_remote(endpoint).push(str(tmp_path), [f"{i}.bz2" for i in range(5)])
+        assert s3.objects == {}
+        assert sum(1 for _, _, query in s3.requests if "delete" in query) == 3
+
+    def test_invalid_xml_raises_remote_error(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        s3.html = True
+
+        with pytest.raises(RemoteError, match="invalid XML"):
+            make_remote(endpoint).push(str(tmp_path))
+
+    def test_invalid_response_raises_remote_error(self, tmp_path):
+        with garbage_server() as endpoint, pytest.raises(RemoteError, match="BadStatusLine"):
+            make_remote(endpoint).push(str(tmp_path))
+
+
+# ── backup_and_retention ────────────────────────────────────────────────────
+
+
+class TestBackupAndRetentionRemote:
+    def test_pushes_new_snapshot(self, s3_server, tmp_path):
+        endpoint, s3 = s3_server
+        target = tmp_path / "data.db"
+        target.write_bytes(b"content")
+        backup_dir = tmp_path / "backups"
+        backup_dir.mkdir()
+
+        remote = {"endpoint": endpoint, "bucket": "bucket", "access_key": "key", "secret_key": "secret"}
+        backup_and_retention(target_path=str(target), backup_dir=str(backup_dir), remote=remote)
+        assert [name.endswith(".db.bz2") for name in s3.objects] == [True]
+
+    @pytest.mark.parametrize("prune", [True, False])
+    def test_mirrors_retention(self, s3_server, tmp_path, prune):
+        endpoint, s3 = s3_server
+        (tmp_path / "old.bz2").write_bytes(b"old")
+        os.utime(tmp_path / "old.bz2", (0, 0))
+        (tmp_path / "new.bz2").write_bytes(b"new")
+        s3.objects = {"old.bz2": b"old", "new.bz2": b"new"}
+
+        backup_and_retention(
+            backup_dir=str(tmp_path), retention_plan=((None, 1),), prune=prune, remote=make_remote(endpoint)
+        )
+        assert sorted(s3.objects) == (["new.bz2"] if prune else ["new.bz2", "old.bz2"])
+
+    def test_unreachable_remote_logs_error(self, tmp_path, caplog):
+        (tmp_path / "a.bz2").write_bytes(b"x")
+        remote = make_remote("http://127.0.0.1:9")
+
+        backup_and_retention(backup_dir=str(tmp_path), remote=remote)
+        assert "Failed to push" in caplog.text
+
+    def test_invalid_response_logs_error(self, tmp_path, caplog):
+        (tmp_path / "a.bz2").write_bytes(b"x")
+
+        with garbage_server() as endpoint:
+            backup_and_retention(backup_dir=str(tmp_path), remote=make_remote(endpoint))
+        assert "Failed to push" in caplog.text
+
+
+class GarbageHandler(StreamRequestHandler):
+    def handle(self) -> None:
+        self.rfile.readline()
+        self.wfile.write(b"garbage\r\n\r\n")
+
+
+@contextmanager
+def garbage_server():
+    """Run a server that answers anything with an invalid HTTP status line, yielding its endpoint URL."""
+    with TCPServer(("127.0.0.1", 0), GarbageHandler) as server:
+        thread = Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+        server.shutdown()
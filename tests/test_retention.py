@@ -1,9 +1,10 @@
 from datetime import datetime, timedelta
+from os import utime
 from os.path import join
 
 import pytest
 
-from hfbr.retention import FileInfo, RetentionPlan, SlotOfRetention, parse_duration
+from hfbr.retention import FileInfo, RetentionPlan, SlotOfRetention, parse_duration, parse_plan
 
 # ── parse_duration ──────────────────────────────────────────────────────────
 
@@ -69,6 +70,14 @@ class TestFileInfo:
         assert fi.pinned is False
         assert isinstance(fi.when, datetime)
 
+    def test_compact(self, tmp_path):
+        dirpath = str(tmp_path)
+        fi = FileInfo(dirpath, "snapshot.bz2", [], 1436154900.0)
+        assert not hasattr(fi, "__dict__")
+        assert fi.dirpath is dirpath
+        assert fi.name == "snapshot.bz2"
+        assert fi.when == datetime.fromtimestamp(1436154900.0)
+
     def test_pinned(self, tmp_path):
         f = tmp_path / "snapshot.bz2"
         f.write_bytes(b"data")
@@ -266,3 +275,69 @@ class TestRetentionPlan:
     def test_default_plan_is_empty(self):
         plan = RetentionPlan()
         assert plan.plan == ()
+
+
+# ── RetentionPlan.supersedes ────────────────────────────────────────────────
+
+
+class TestSupersedes:
+    NOON = datetime(2026, 1, 1, 12).timestamp()
+
+    def make_snapshot(self, tmp_path, timestamp, name="snap.bz2"):
+        f = tmp_path / name
+        f.write_bytes(b"x")
+        utime(str(f), (timestamp, timestamp))
+
+    def test_same_timeslots(self, tmp_path):
+        self.make_snapshot(tmp_path, self.NOON)
+        plan = parse_plan([["1 day", 5], ["1 hour", 18]])
+        assert plan.supersedes(str(tmp_path), self.NOON + 1200)
+
+    def test_new_timeslot(self, tmp_path):
+        self.make_snapshot(tmp_path, self.NOON)
+        plan = parse_plan([["1 day", 5], ["1 hour", 18]])
+        assert not plan.supersedes(str(tmp_path), self.NOON + 3600)
+
+    def test_month_and_year_timeslots(self, tmp_path):
+        self.make_snapshot(tmp_path, datetime(2026, 1, 31, 23).timestamp())
+        plan = parse_plan([["year", None], ["month", 9]])
+        assert plan.supersedes(str(tmp_path), datetime(2026, 1, 31, 23, 30).timestamp())
+        assert not plan.supersedes(str(tmp_path), datetime(2026, 2, 1).timestamp())
+
+    def test_no_snapshots_yet(self, tmp_path):
+        plan = parse_plan([["1 day", 5]])
+        assert not plan.supersedes(str(tmp_path), self.NOON)
+
+    def test_unlimited_plans_keep_everything(self, tmp_path):
+        self.make_snapshot(tmp_path, self.NOON)
+        assert not RetentionPlan().supersedes(str(tmp_path), self.NOON + 60)
+        assert not parse_plan([["1 day", 5], [None, None]]).supersedes(str(tmp_path), self.NOON + 60)
+
+    def test_latest_snapshots_min_interval(self, tmp_path):
+        self.make_snapshot(tmp_path, self.NOON)
+        plan = parse_plan([["1 day", 5], [None, 10]])
+        assert plan.supersedes(str(tmp_path), self.NOON + 1200)
+        assert plan.supersedes(str(tmp_path), self.NOON + 1200, timedelta(hours=1))
+        assert not plan.supersedes(str(tmp_path), self.NOON + 3600, timedelta(hours=1))
+
+    def test_min_interval_without_latest_snapshots(self, tmp_path):
+        self.make_snapshot(tmp_path, self.NOON)
+        plan = parse_plan([["1 day", 5], ["1 hour", 18]])
+        assert plan.supersedes(str(tmp_path), self.NOON + 1200, timedelta(minutes=10))
+
+    def test_single_latest_snapshot_declared_first(self, tmp_path):
+        self.make_snapshot(tmp_path, self.NOON)
+        assert not parse_plan([[None, 1], ["1 day", 5]]).supersedes(str(tmp_path), self.NOON + 60)
+        assert parse_plan([[None, 2], ["1 day", 5]]).supersedes(str(tmp_path), self.NOON + 60)
+
+    def test_skipped_snapshot_would_be_pruned(self, tmp_path):
+        plan = parse_plan([["1 day", 5], ["1 hour", 18], [None, 10]])
+        self.make_snapshot(tmp_path, self.NOON, "a.bz2")
+        assert plan.supersedes(str(tmp_path), self.NOON + 1200)
+        self.make_snapshot(tmp_path, self.NOON + 1200, "b.bz2")
+        files = [FileInfo(str(tmp_path), name, []) for name in ("a.bz2", "b.bz2")]
+        plan.muster(files)
+        assert [f.name for f in files if f.pinned] == ["b.bz2", "a.bz2"]
+        files = [FileInfo(str(tmp_path), name, []) for name in ("a.bz2", "b.bz2")]
+        parse_plan([["1 day", 5], ["1 hour", 18]]).muster(files)
+        assert [f.name for f in files if f.pinned] == ["a.bz2"]
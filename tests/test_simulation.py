@@ -0,0 +1,120 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from hfbr.retention import RetentionPlan, parse_plan
+from hfbr.simulation import (
+    SimulatedFile,
+    diff_kept,
+    recorded_timeline,
+    simulate,
+    synthetic_timeline,
+)
+
+START = datetime(2026, 1, 1, tzinfo=UTC).timestamp()  # days are aligned to the epoch, not local midnight
+
+# ── timelines ───────────────────────────────────────────────────────────────
+
+
+class TestSyntheticTimeline:
+    def test_one_snapshot_per_interval(self):
+        timeline = synthetic_timeline(timedelta(days=1), timedelta(hours=1), start=START)
+        assert len(timeline) == 24
+        assert timeline[1][0] - timeline[0][0] == 3600
+
+    def test_change_rate_skips_runs(self):
+        timeline = synthetic_timeline(timedelta(days=10), timedelta(hours=1), change_rate=0.5, start=START, seed=1)
+        assert 0 < len(timeline) < 240
+
+    def test_seed_is_reproducible(self):
+        args = (timedelta(days=10), timedelta(hours=1), 0.5)
+        assert synthetic_timeline(*args, start=START, seed=3) == synthetic_timeline(*args, start=START, seed=3)
+
+    def test_size(self):
+        timeline = synthetic_timeline(timedelta(hours=2), timedelta(hours=1), size=42, start=START)
+        assert all(size == 42 for _, size in timeline)
+
+
+class TestRecordedTimeline:
+    def test_from_text_file(self, tmp_path):
+        recorded = tmp_path / "timeline.txt"
+        recorded.write_text("# comment\n20260101-1200 100\n\n20260101-130000\n1767225600.5 7\n")
+        timeline = recorded_timeline(str(recorded))
+        assert timeline == [
+            (datetime(2026, 1, 1, 12).timestamp(), 100),
+            (datetime(2026, 1, 1, 13).timestamp(), 0),
+            (1767225600.5, 7),
+        ]
+
+    def test_invalid_timestamp_raises(self, tmp_path):
+        recorded = tmp_path / "timeline.txt"
+        recorded.write_text("yesterday\n")
+        with pytest.raises(ValueError, match="Invalid timestamp"):
+            recorded_timeline(str(recorded))
+
+    def test_from_backup_dir(self, tmp_path):
+        (tmp_path / "a.bz2").write_bytes(b"abc")
+        (tmp_path / "last_hash").write_bytes(b"x")
+        timeline = recorded_timeline(str(tmp_path))
+        assert len(timeline) == 1
+        assert timeline[0][1] == 3
+
+
+# ── simulate ────────────────────────────────────────────────────────────────
+
+
+class TestSimulate:
+    def test_no_plan_keeps_all(self):
+        timeline = synthetic_timeline(timedelta(days=2), timedelta(hours=1), size=10, start=START)
+        result = simulate(RetentionPlan(), timeline)
+        assert result.written == 48
+        assert len(result.kept) == 48
+        assert result.samples[-1].kept_bytes == 480
+
+    def test_replay_bounds_kept(self):
+        plan = parse_plan([["1 day", 3], [None, 5]])
+        timeline = synthetic_timeline(timedelta(days=10), timedelta(hours=1), size=1, start=START)
+        result = simulate(plan, timeline)
+        assert result.written == 240
+        assert len(result.kept) == 8
+
+    def test_replay_keeps_earliest_of_each_day(self):
+        plan = parse_plan([["1 day", 3]])
+        timeline = synthetic_timeline(timedelta(days=10), timedelta(hours=1), start=START)
+        result = simulate(plan, timeline)
+        assert all(f.timestamp % 86400 == 0 for f in result.kept)
+
+    def test_once_applies_plan_to_whole_timeline(self):
+        plan = parse_plan([["1 week", 2], ["1 day", 3], [None, 5]])  # months are local, unlike START
+        timeline = synthetic_timeline(timedelta(days=90), timedelta(hours=6), start=START)
+        result = simulate(plan, timeline, replay=False)
+        assert result.written == 360
+        assert len(result.kept) == 9  # the first snapshot of today is also one of the latest
+
+    def test_report_samples(self):
+        timeline = synthetic_timeline(timedelta(days=10), timedelta(hours=1), start=START)
+        result = simulate(parse_plan([["1 day", 3]]), timeline, report_every=timedelta(days=1))
+        assert len(result.samples) == 10
+        assert result.samples[0].written == 24
+        assert result.samples[0].kept == 1
+
+    def test_empty_timeline(self):
+        result = simulate(parse_plan([["1 day", 3]]), [], report_every=timedelta(days=1))
+        assert result.written == 0
+        assert result.samples == []
+
+
+# ── diff_kept ───────────────────────────────────────────────────────────────
+
+
+class TestDiffKept:
+    def test_same_sets(self):
+        files = [SimulatedFile(START, 1)]
+        assert diff_kept(files, files) == []
+
+    def test_differences_newest_first(self):
+        shared = SimulatedFile(START, 1)
+        ours = SimulatedFile(START + 60, 1)
+        theirs = SimulatedFile(START + 120, 1)
+        lines = diff_kept([ours, shared], [theirs, shared])
+        assert lines == ["+ " + str(theirs), "- " + str(ours)]